@@ -0,0 +1,291 @@
+import argparse
+import json
+import platform
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import imageio
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from episode_loader import load_episode
+from render_manifest import code_version
+from traj_render import GRIPPER_CLOSE_THRESH, GRIPPER_OPEN_THRESH, make_renderer, project_episode
+from video_io import iter_frames, open_writer, stream_video
+
+
+# 固定的俯视相机，投影后轨迹大致落在 256x256 画面中间
+INTRINSIC = np.array([[309.0, 0.0, 128.0], [0.0, 309.0, 128.0], [0.0, 0.0, 1.0]])
+EXTRINSIC = np.array([
+    [1.0, 0.0, 0.0, 0.0],
+    [0.0, -1.0, 0.0, 0.0],
+    [0.0, 0.0, -1.0, 1.9],
+    [0.0, 0.0, 0.0, 1.0],
+])
+
+
+def synthetic_episode(length, rng):
+    """Random-walk eef positions with periodic gripper toggles, as (state, action)."""
+    state = np.zeros((length, 8), dtype=np.float32)
+    state[:, :3] = np.cumsum(rng.normal(0, 0.004, (length, 3)), axis=0) + [0.0, 0.0, 0.9]
+    closed = (np.arange(length) // 60) % 2 == 1
+    width = np.where(closed, 0.0, 0.04) + rng.normal(0, 0.002, length)
+    state[:, 6] = width / 2
+    state[:, 7] = -width / 2
+    action = rng.normal(0, 0.3, (length, 7)).astype(np.float32)
+    return state, action
+
+
+def synthetic_frames(length, resolution, rng):
+    """Smooth moving noise; easier on the codec than white noise and closer to real footage."""
+    base = rng.integers(0, 255, (resolution // 8 + 4, resolution // 8 + 4, 3), dtype=np.uint8)
+    base = cv2.resize(base, None, fx=8, fy=8, interpolation=cv2.INTER_LINEAR)
+    for i in range(length):
+        dx, dy = (i // 2) % 32, (i // 3) % 32
+        yield np.ascontiguousarray(base[dy : dy + resolution, dx : dx + resolution])
+
+
+def make_synthetic_dataset(root, n_episodes, length, resolution, seed=0):
+    """Writes a minimal LeRobot-style layout (data/, videos/, meta/tasks.jsonl) under root."""
+    root = Path(root)
+    rng = np.random.default_rng(seed)
+    parquet_dir = root / "data/chunk-000"
+    video_dir = root / "videos/chunk-000/observation.images.image"
+    parquet_dir.mkdir(parents=True, exist_ok=True)
+    video_dir.mkdir(parents=True, exist_ok=True)
+    (root / "meta").mkdir(parents=True, exist_ok=True)
+    with open(root / "meta/tasks.jsonl", "w", encoding="utf-8") as f:
+        f.write(json.dumps({"task_index": 0, "task": "synthetic task"}) + "\n")
+
+    for episode_index in range(n_episodes):
+        state, action = synthetic_episode(length, rng)
+        table = pa.table({
+            "observation.state": pa.FixedSizeListArray.from_arrays(pa.array(state.reshape(-1)), state.shape[1]),
+            "action": pa.FixedSizeListArray.from_arrays(pa.array(action.reshape(-1)), action.shape[1]),
+            "timestamp": np.arange(length, dtype=np.float32) / 20,
+            "frame_index": np.arange(length, dtype=np.int64),
+            "episode_index": np.full(length, episode_index, dtype=np.int64),
+            "index": np.arange(length, dtype=np.int64),
+            "task_index": np.zeros(length, dtype=np.int64),
+        })
+        name = f"episode_{episode_index:06d}"
+        pq.write_table(table, parquet_dir / f"{name}.parquet")
+        writer = imageio.get_writer(video_dir / f"{name}.mp4", fps=20, codec="libx264")
+        for frame in synthetic_frames(length, resolution, rng):
+            writer.append_data(frame)
+        writer.close()
+    return root
+
+
+def draw_25d(background_image,traj,index):
+    """Draws the 32-step trajectory window starting at `index` from a ProjectedEpisode.
+
+    The original per-frame drawing, kept as the reference that check_exact
+    compares TrajectoryRenderer against.
+    """
+    episode_len = len(traj.pixels)
+
+    # demonstration背景
+    image = background_image.copy()
+
+    # Ensure we only draw a circle as soon as the gripper is closed or opened.
+    is_catched = False
+
+    start = index
+
+    if start+32 <= episode_len:
+        end = start+32
+    else:
+        end = episode_len
+
+    # Store 2D positions of the eef in this episode in a list
+    TempProgress = [tuple(p) for p in traj.pixels[start:end].tolist()]
+    # Store gripper height in a list.
+    gripper_height_list = traj.heights[start:end].tolist()
+    gripper_closed_list = traj.gripper[start:end].tolist()
+
+    for point, gripper_closed in zip(TempProgress, gripper_closed_list):
+        # Draw Interaction Markers.
+        if is_catched == False and gripper_closed < GRIPPER_CLOSE_THRESH:
+            is_catched = True
+            # If the gripper is closed, draw a green circle on the image.
+            cv2.circle(image, point, radius=5, color=(0, 255, 0), thickness=2)
+        if is_catched == True and gripper_closed > GRIPPER_OPEN_THRESH:
+            is_catched = False
+            # If the gripper is opened, draw a blue circle on the image.
+            cv2.circle(image, point, radius=5, color=(255, 0, 0), thickness=2)
+
+    # Draw gripper height in green color. The higher, the lighter.
+    # Draw the Temporal Progress in red color. The earlier the time, the lighter the color of the line segment. Line thickness is 3.
+    max_height = max(gripper_height_list)
+    min_height = min(gripper_height_list)
+
+    for i in range(1, len(gripper_height_list)):
+        # Normalize the gripper height to [0,1]
+        if min_height != max_height:
+            normalized_gripper_height = float(gripper_height_list[i] - min_height) / (max_height - min_height)
+            color = (0, int(255 * normalized_gripper_height), 255 * i / (episode_len - 1))
+        else:
+            color = (0, 255, 255 * i / (episode_len - 1))
+        cv2.line(image, TempProgress[i - 1], TempProgress[i], color=color, thickness=2)
+
+    return image
+
+
+def check_exact(traj, frames):
+    """Renders every frame with draw_25d and with the exact renderer; raises if any frame differs."""
+    renderer = make_renderer(traj, window=32, overlay="exact")
+    mismatches = [i for i, frame in enumerate(frames) if not np.array_equal(draw_25d(frame, traj, i), renderer.render(frame, i))]
+    if mismatches:
+        raise AssertionError(f"TrajectoryRenderer differs from draw_25d on {len(mismatches)}/{len(frames)} frames, first at {mismatches[0]}")
+    return len(frames)
+
+
+def _timed(results, stage, frames, fn, **labels):
+    start = time.perf_counter()
+    out = fn()
+    seconds = time.perf_counter() - start
+    results.append({
+        "stage": stage,
+        **labels,
+        "frames": frames,
+        "seconds": round(seconds, 6),
+        "fps": round(frames / seconds, 2) if seconds > 0 else None,
+        "ms_per_frame": round(1000 * seconds / frames, 4) if frames else None,
+    })
+    return out
+
+
+def bench_resolution(root, resolution, windows, overlays, encoders, results):
+    parquet_files = sorted((root / "data/chunk-000").glob("*.parquet"))
+    for parquet_path in parquet_files:
+        video_path = root / "videos/chunk-000/observation.images.image" / f"{parquet_path.stem}.mp4"
+        labels = {"resolution": resolution, "episode": parquet_path.stem}
+
+        episode = load_episode(parquet_path)
+        n = len(episode)
+        _timed(results, "parquet_load", n, lambda: load_episode(parquet_path), **labels)
+        frames = _timed(results, "decode", n, lambda: list(iter_frames(video_path)), **labels)
+        traj = _timed(results, "projection", n, lambda: project_episode(episode.state, EXTRINSIC, INTRINSIC), **labels)
+        # exact 模式必须与原始逐帧绘制逐像素一致
+        check_exact(traj, frames)
+
+        drawn = frames
+        for window in windows:
+            for overlay in overlays:
+                renderer = make_renderer(traj, window=window, overlay=overlay)
+                drawn = _timed(
+                    results, "overlay", n, lambda: [renderer.render(f, i) for i, f in enumerate(frames)],
+                    window=window, variant=overlay, **labels,
+                )
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, encoder_kwargs in encoders.items():
+                out_path = Path(tmp) / f"{name}.mp4"
+
+                def _encode():
+                    writer = open_writer(out_path, 20, **encoder_kwargs)
+                    for frame in drawn:
+                        writer.append_data(frame)
+                    writer.close()
+
+                _timed(results, "encode", n, _encode, variant=name, **labels)
+
+            renderer = make_renderer(traj, window=windows[0], overlay=overlays[0])
+            _timed(
+                results, "stream_pipeline", n,
+                lambda: stream_video(video_path, Path(tmp) / "stream.mp4", renderer.render, expected_len=n),
+                window=windows[0], variant=overlays[0], **labels,
+            )
+
+
+def summarize(results):
+    """Mean ms/frame per (stage, resolution, window, variant)."""
+    groups = {}
+    for r in results:
+        key = (r["stage"], r["resolution"], r.get("window"), r.get("variant"))
+        groups.setdefault(key, []).append(r)
+    summary = []
+    for (stage, resolution, window, variant), rows in groups.items():
+        frames = sum(r["frames"] for r in rows)
+        seconds = sum(r["seconds"] for r in rows)
+        summary.append({
+            "stage": stage, "resolution": resolution, "window": window, "variant": variant,
+            "fps": round(frames / seconds, 2) if seconds > 0 else None,
+            "ms_per_frame": round(1000 * seconds / frames, 4) if frames else None,
+        })
+    return summary
+
+
+def compare(summary, baseline_path):
+    """Prints ms/frame change against a previous report; positive means slower."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    key = lambda r: (r["stage"], r["resolution"], r["window"], r["variant"])
+    old = {key(r): r["ms_per_frame"] for r in baseline["summary"]}
+    print(f"对比 {baseline_path} (code_version={baseline['code_version']})")
+    for row in summary:
+        before = old.get(key(row))
+        if before:
+            change = 100 * (row["ms_per_frame"] - before) / before
+            print(f"{row['stage']:16s} res={row['resolution']:<5} window={str(row['window']):<5} {str(row['variant']):18s} "
+                  f"{before:>9.3f} -> {row['ms_per_frame']:>9.3f} ms/frame ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--resolutions", type=int, nargs="+", default=[256, 512])
+    parser.add_argument("--windows", type=int, nargs="+", default=[32, 128])
+    parser.add_argument("--overlays", nargs="+", default=["exact", "batched"])
+    parser.add_argument("--episodes", type=int, default=2)
+    parser.add_argument("--length", type=int, default=300, help="每个 episode 的帧数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, default=Path("bench_results.json"))
+    parser.add_argument("--baseline", type=Path, default=None, help="之前的结果文件，用于对比回归")
+    parser.add_argument("--workdir", type=Path, default=None, help="合成数据目录，默认用临时目录并在结束后删除")
+    args = parser.parse_args()
+
+    encoders = {
+        "imageio": {"backend": "imageio"},
+        "ffmpeg_ultrafast": {"backend": "ffmpeg", "preset": "ultrafast"},
+        "ffmpeg_medium": {"backend": "ffmpeg", "preset": "medium"},
+    }
+
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="traj_bench_"))
+    results = []
+    try:
+        for resolution in args.resolutions:
+            root = make_synthetic_dataset(workdir / f"res{resolution}", args.episodes, args.length, resolution, args.seed)
+            bench_resolution(root, resolution, args.windows, args.overlays, encoders, results)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "code_version": code_version(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "config": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        "summary": summarize(results),
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    for row in report["summary"]:
+        print(f"{row['stage']:16s} res={row['resolution']:<5} window={str(row['window']):<5} {str(row['variant']):18s} "
+              f"{row['ms_per_frame']:>9.3f} ms/frame {row['fps']:>10.1f} fps")
+    if args.baseline is not None:
+        compare(report["summary"], args.baseline)
+    print(args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import json
+import os
+import pathlib
+from pathlib import Path
+
+import numpy as np
+
+
+# 相机参数缓存，可用 LIBERO_CAMERA_CACHE 指定到共享盘上
+DEFAULT_CACHE_PATH = Path(os.environ.get("LIBERO_CAMERA_CACHE", Path.home() / ".cache" / "libero_traj" / "camera_params.json"))
+
+
+def _get_libero_env(task, resolution, seed):
+    """Initializes and returns the LIBERO environment, along with the task description."""
+    # 延迟导入：缓存命中时完全不需要 libero/robosuite
+    from libero.libero import get_libero_path
+    from libero.libero.envs import OffScreenRenderEnv
+
+    task_description = task.language
+    task_bddl_file = pathlib.Path(get_libero_path("bddl_files")) / task.problem_folder / task.bddl_file
+    env_args = {
+        "bddl_file_name": task_bddl_file,
+        "camera_heights": resolution,
+        "camera_widths": resolution,
+        "render_gpu_device_id": None,
+        "renderer_config": {"offscreen": True},
+    }
+    env = OffScreenRenderEnv(**env_args)
+    env.seed(seed)  # IMPORTANT: seed seems to affect object positions even when using fixed initial state
+    env.reset()
+    return env, task_description
+
+
+def camera_key(suite, task_id, resolution, camera_name, seed):
+    return f"{suite}/{task_id}/{resolution}/{camera_name}/{seed}"
+
+
+def load_cache(cache_path=DEFAULT_CACHE_PATH):
+    cache_path = Path(cache_path)
+    if not cache_path.exists():
+        return {"suites": {}, "cameras": {}}
+    with open(cache_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_cache(cache, cache_path=DEFAULT_CACHE_PATH):
+    """Writes the cache atomically so concurrent readers never see a partial file."""
+    cache_path = Path(cache_path)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_name(f".{cache_path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, cache_path)
+
+
+def _store(cache_path, section, key, value):
+    # 重新读一次再写，避免覆盖其他进程同时写入的条目
+    cache = load_cache(cache_path)
+    cache[section][key] = value
+    save_cache(cache, cache_path)
+    return cache
+
+
+def _calibrate(task_suite, task_id, resolution, camera_name, seed):
+    from robosuite.utils import camera_utils as CU
+
+    task = task_suite.get_task(task_id)
+    env, language = _get_libero_env(task, resolution, seed)
+    try:
+        intrinsic_matrix = CU.get_camera_intrinsic_matrix(env.sim, camera_name, resolution, resolution)
+        extrinsic_matrix = CU.get_camera_extrinsic_matrix(env.sim, camera_name)
+    finally:
+        env.close()
+    return {
+        "language": language,
+        "intrinsic": np.asarray(intrinsic_matrix).tolist(),
+        "extrinsic": np.asarray(extrinsic_matrix).tolist(),
+    }
+
+
+def get_camera_params(suite, task_ids=None, resolution=256, camera_name="agentview", seed=7, cache_path=DEFAULT_CACHE_PATH):
+    """Returns [(language, intrinsic, extrinsic)] for the given tasks of a suite.
+
+    task_ids=None means every task in the suite. Entries missing from the
+    cache are calibrated once by booting the LIBERO env and written back;
+    a warm cache never imports libero or robosuite.
+    """
+    cache = load_cache(cache_path)
+    task_suite = None
+
+    def _suite():
+        nonlocal task_suite
+        if task_suite is None:
+            from libero.libero import benchmark
+
+            task_suite = benchmark.get_benchmark_dict()[suite]()
+        return task_suite
+
+    if task_ids is None:
+        if suite not in cache["suites"]:
+            cache = _store(cache_path, "suites", suite, {"n_tasks": _suite().n_tasks})
+        task_ids = range(cache["suites"][suite]["n_tasks"])
+
+    results = []
+    for task_id in task_ids:
+        key = camera_key(suite, task_id, resolution, camera_name, seed)
+        if key not in cache["cameras"]:
+            print(f"calibrating {key}")
+            cache = _store(cache_path, "cameras", key, _calibrate(_suite(), task_id, resolution, camera_name, seed))
+        entry = cache["cameras"][key]
+        results.append((entry["language"], np.array(entry["intrinsic"]), np.array(entry["extrinsic"])))
+    return results
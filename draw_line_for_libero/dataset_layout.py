@@ -0,0 +1,109 @@
+import json
+import re
+import string
+from pathlib import Path
+from typing import NamedTuple
+
+
+# LeRobot v2.x 默认值，meta/info.json 不存在时使用
+DEFAULT_CHUNKS_SIZE = 1000
+DEFAULT_DATA_PATH = "data/chunk-{episode_chunk:03d}/episode_{episode_index:06d}.parquet"
+DEFAULT_VIDEO_PATH = "videos/chunk-{episode_chunk:03d}/{video_key}/episode_{episode_index:06d}.mp4"
+
+
+class EpisodeRef(NamedTuple):
+    name: str           # parquet 文件名（不含后缀），脚本之间用它做 key
+    episode_index: int
+    chunk: int
+    parquet_path: Path
+
+
+def _template_regex(template):
+    """Turns a path template into a regex with named groups for its fields."""
+    pattern = ""
+    for literal, field, _, _ in string.Formatter().parse(template):
+        pattern += re.escape(literal)
+        if field is not None:
+            pattern += rf"(?P<{field}>\d+)" if field in ("episode_index", "episode_chunk") else rf"(?P<{field}>[^/]+)"
+    return re.compile(pattern + "$")
+
+
+def _template_glob(template):
+    return re.sub(r"\{[^}]*\}", "*", template)
+
+
+class DatasetLayout:
+    """Chunked file layout of a LeRobot dataset, driven by meta/info.json.
+
+    chunks_size and the data_path/video_path templates come from info.json
+    (LeRobot v2 defaults if it is missing). Derived trees such as
+    videos_traj/ use the video template with its top-level directory
+    replaced, so they are chunked the same way as videos/.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        info_path = self.root / "meta" / "info.json"
+        info = json.loads(info_path.read_text(encoding="utf-8")) if info_path.exists() else {}
+        self.chunks_size = info.get("chunks_size", DEFAULT_CHUNKS_SIZE)
+        self.data_path = info.get("data_path", DEFAULT_DATA_PATH)
+        self.video_path = info.get("video_path") or DEFAULT_VIDEO_PATH
+        self.video_keys = [k for k, ft in info.get("features", {}).items() if ft.get("dtype") == "video"]
+        self._data_regex = _template_regex(self.data_path)
+        self._episodes = None
+
+    def chunk_of(self, episode_index):
+        return episode_index // self.chunks_size
+
+    def parquet_file(self, episode_index):
+        return self.root / self.data_path.format(episode_chunk=self.chunk_of(episode_index), episode_index=episode_index)
+
+    def _video_template(self, group):
+        top, rest = self.video_path.split("/", 1)
+        return f"{group}/{rest}" if group != top else self.video_path
+
+    def video_file(self, video_key, episode, group="videos"):
+        """Video of an episode (index or EpisodeRef) under videos/ or a derived tree like videos_traj/."""
+        episode_index = episode.episode_index if isinstance(episode, EpisodeRef) else episode
+        template = self._video_template(group)
+        return self.root / template.format(episode_chunk=self.chunk_of(episode_index), video_key=video_key, episode_index=episode_index)
+
+    def derived_file(self, group, episode, suffix):
+        """Per-episode file mirroring the data/ layout under another tree, e.g. traj_vectors/chunk-000/episode_000000.npz."""
+        episode_index = episode.episode_index if isinstance(episode, EpisodeRef) else episode
+        _, rest = self.data_path.split("/", 1)
+        path = self.root / f"{group}/{rest}".format(episode_chunk=self.chunk_of(episode_index), episode_index=episode_index)
+        return path.with_suffix(suffix)
+
+    def episodes(self):
+        """Every episode parquet of the dataset across all chunks, sorted by episode index."""
+        if self._episodes is None:
+            refs = []
+            for path in self.root.glob(_template_glob(self.data_path)):
+                match = self._data_regex.search(path.relative_to(self.root).as_posix())
+                if match is None or path.name.startswith("."):
+                    continue
+                episode_index = int(match.group("episode_index"))
+                refs.append(EpisodeRef(path.stem, episode_index, self.chunk_of(episode_index), path))
+            self._episodes = sorted(refs, key=lambda r: r.episode_index)
+        return self._episodes
+
+    def chunks(self):
+        """{chunk: [EpisodeRef]} in chunk order."""
+        chunks = {}
+        for ref in self.episodes():
+            chunks.setdefault(ref.chunk, []).append(ref)
+        return dict(sorted(chunks.items()))
+
+    def by_name(self):
+        return {ref.name: ref for ref in self.episodes()}
+
+    def videos(self, group="videos"):
+        """Yields (video_key, episode_index, path) for every mp4 under videos/ or a derived tree."""
+        template = self._video_template(group)
+        regex = _template_regex(template)
+        for path in sorted(self.root.glob(_template_glob(template))):
+            match = regex.search(path.relative_to(self.root).as_posix())
+            if match is None or path.name.startswith("."):
+                continue
+            yield match.group("video_key"), int(match.group("episode_index")), path
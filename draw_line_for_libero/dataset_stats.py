@@ -0,0 +1,172 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from dataset_layout import DatasetLayout
+from episode_loader import load_episode
+from episode_store import EpisodeStore, open_episode_store
+
+
+# 与 lerobot.datasets.utils.STATS_PATH 一致
+STATS_PATH = "meta/stats.json"
+# LeRobot 的 q01/q10/q50/q90/q99
+DEFAULT_QUANTILES = (0.01, 0.10, 0.50, 0.90, 0.99)
+# 输出的 key -> EpisodeStore 中的列
+COLUMNS = {"observation.state": "state", "action": "action"}
+
+
+class Moments(NamedTuple):
+    """Mergeable per-dimension summary of a block of frames (float64)."""
+    count: int
+    mean: np.ndarray
+    m2: np.ndarray      # 离均差平方和
+    min: np.ndarray
+    max: np.ndarray
+
+
+def moments(array):
+    array = np.asarray(array, dtype=np.float64)
+    if len(array) == 0:
+        return Moments(0, None, None, None, None)
+    mean = array.mean(axis=0)
+    return Moments(len(array), mean, ((array - mean) ** 2).sum(axis=0), array.min(axis=0), array.max(axis=0))
+
+
+def merge_moments(a, b):
+    """Chan et al. pairwise merge; exact regardless of how the frames were split."""
+    if a.count == 0:
+        return b
+    if b.count == 0:
+        return a
+    n = a.count + b.count
+    delta = b.mean - a.mean
+    return Moments(
+        n,
+        a.mean + delta * (b.count / n),
+        a.m2 + b.m2 + delta**2 * (a.count * b.count / n),
+        np.minimum(a.min, b.min),
+        np.maximum(a.max, b.max),
+    )
+
+
+def quantile_key(q):
+    """LeRobot-style key in percent: 0.01 -> q01, 0.07 -> q07, 0.995 -> q99.5."""
+    # 先取整到 1e-6 个百分点，消掉 0.07 * 100 = 7.000000000000001 这类浮点误差
+    return f"q{round(q * 100, 6):02g}"
+
+
+def _episode_moments(episode):
+    return {key: moments(getattr(episode, column)) for key, column in COLUMNS.items()}
+
+
+def _load_block(parquet_files):
+    """Reads a block of episode parquets; returns (moments, columns) per episode."""
+    results = []
+    for parquet_file in parquet_files:
+        episode = load_episode(parquet_file)
+        results.append((_episode_moments(episode), {key: getattr(episode, column) for key, column in COLUMNS.items()}))
+    return results
+
+
+def summarize(per_episode, values, quantiles=DEFAULT_QUANTILES):
+    """Stats dict from per-episode moments (merged in order) and the full {key: (N, D)} columns.
+
+    Quantiles are not part of the moment merge: they are an exact
+    np.quantile pass over the full columns, one dimension at a time.
+    """
+    stats = {}
+    for key in COLUMNS:
+        total = Moments(0, None, None, None, None)
+        for m in per_episode:
+            total = merge_moments(total, m[key])
+        column = values[key]
+        per_dim = np.stack([np.quantile(column[:, d], quantiles) for d in range(column.shape[1])], axis=1)
+        stats[key] = {
+            "min": total.min.tolist(),
+            "max": total.max.tolist(),
+            "mean": total.mean.tolist(),
+            "std": np.sqrt(total.m2 / total.count).tolist(),
+            "count": [total.count],
+            **{quantile_key(q): v.tolist() for q, v in zip(quantiles, per_dim)},
+        }
+    return stats
+
+
+def compute_stats(store_path, quantiles=DEFAULT_QUANTILES):
+    """min/max/mean/std/count and quantiles of state/action over every episode of an episode store.
+
+    The store is already memory-mapped, so this runs in one process: the
+    work is a few passes over contiguous columns, and process start-up
+    would cost more than it saves.
+    """
+    store = EpisodeStore(store_path)
+    per_episode = [_episode_moments(store.episode(i)) for i in range(len(store))]
+    return summarize(per_episode, {key: getattr(store, column) for key, column in COLUMNS.items()}, quantiles)
+
+
+def compute_parquet_stats(parquet_files, workers=1, quantiles=DEFAULT_QUANTILES):
+    """Same stats as compute_stats, read straight from episode parquets.
+
+    Reading the parquets is the expensive part, so with workers > 1 blocks
+    of files are read and reduced to per-episode moments in a process pool.
+    Results are merged in file order, so they do not depend on workers.
+    """
+    parquet_files = list(parquet_files)
+    blocks = [list(b) for b in np.array_split(parquet_files, max(1, min(workers, len(parquet_files)) * 4)) if len(b)]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = [r for block in pool.map(_load_block, blocks) for r in block]
+    else:
+        results = [r for block in blocks for r in _load_block(block)]
+    if not results:
+        raise FileNotFoundError("no episode parquets to compute stats from")
+    per_episode = [m for m, _ in results]
+    values = {key: np.concatenate([v[key] for _, v in results]) for key in COLUMNS}
+    return summarize(per_episode, values, quantiles)
+
+
+def compute_dataset_stats(dataset_root, workers=1, quantiles=DEFAULT_QUANTILES):
+    """compute_stats over the dataset's episode store if it is fresh, else compute_parquet_stats over its parquets."""
+    store = open_episode_store(dataset_root)
+    if store is not None:
+        return compute_stats(store.path, quantiles)
+    return compute_parquet_stats([ref.parquet_path for ref in DatasetLayout(dataset_root).episodes()], workers, quantiles)
+
+
+def write_stats(stats, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--root",
+        type=Path,
+        required=True,
+        help="LeRobot dataset root (e.g. `.../libero_10_no_noops_1.0.0_lerobot`).",
+    )
+    parser.add_argument("--out", type=Path, default=None, help=f"Output file, defaults to `<root>/{STATS_PATH}`.")
+    parser.add_argument("--workers", type=int, default=1, help="没有最新的 episode store 时并行读取 parquet 的进程数")
+    parser.add_argument("--quantiles", type=float, nargs="+", default=list(DEFAULT_QUANTILES), help="要计算的分位数")
+    args = parser.parse_args()
+
+    stats = compute_dataset_stats(args.root, args.workers, args.quantiles)
+    out_path = args.out or args.root / STATS_PATH
+    write_stats(stats, out_path)
+    for key, s in stats.items():
+        print(f"{key}: count={s['count'][0]}\n  mean={np.round(s['mean'], 4)}\n  std={np.round(s['std'], 4)}")
+    print(out_path)
+
+
+if __name__ == "__main__":
+    main()
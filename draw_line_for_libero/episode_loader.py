@@ -0,0 +1,46 @@
+from typing import NamedTuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+class Episode(NamedTuple):
+    """Columns of one LeRobot episode parquet as contiguous arrays."""
+    state: np.ndarray   # (T, D) float32, observation.state
+    action: np.ndarray  # (T, A) float32
+    task_index: int
+    episode_index: int
+
+    def __len__(self):
+        return len(self.state)
+
+
+def column_to_numpy(column, dtype=np.float32):
+    """Converts a list/fixed-size-list column into a contiguous (T, D) array."""
+    if isinstance(column, pa.ChunkedArray):
+        column = column.combine_chunks()
+    n = len(column)
+    if n == 0:
+        return np.zeros((0, 0), dtype=dtype)
+    if pa.types.is_list(column.type) or pa.types.is_large_list(column.type) or pa.types.is_fixed_size_list(column.type):
+        values = column.flatten().to_numpy(zero_copy_only=False)
+        return np.ascontiguousarray(values.reshape(n, -1), dtype=dtype)
+    return np.ascontiguousarray(column.to_numpy(zero_copy_only=False), dtype=dtype)
+
+
+def _scalar(table, name, default=-1):
+    if name not in table.column_names or table.num_rows == 0:
+        return default
+    return int(table.column(name)[0].as_py())
+
+
+def load_episode(parquet_path, state_key="observation.state", action_key="action"):
+    """Reads one episode parquet directly with pyarrow (memory-mapped, no HF cache copy)."""
+    schema = pq.read_schema(parquet_path)
+    columns = [c for c in (state_key, action_key, "task_index", "episode_index") if c in schema.names]
+    table = pq.read_table(parquet_path, columns=columns, memory_map=True)
+
+    state = column_to_numpy(table.column(state_key)) if state_key in columns else np.zeros((table.num_rows, 0), np.float32)
+    action = column_to_numpy(table.column(action_key)) if action_key in columns else np.zeros((table.num_rows, 0), np.float32)
+    return Episode(state, action, _scalar(table, "task_index"), _scalar(table, "episode_index"))
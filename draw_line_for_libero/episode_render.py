@@ -0,0 +1,294 @@
+import argparse
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import tqdm
+
+from camera_cache import DEFAULT_CACHE_PATH
+from dataset_layout import DatasetLayout
+from episode_loader import load_episode
+from episode_store import EpisodeStore, load_tasks, open_episode_store
+from frame_cache import DEFAULT_MAX_GB, enable as enable_frame_cache
+from render_manifest import RenderManifest, job_fingerprint, params_digest
+from scan_videos import load_quarantine
+from stage_profile import enable as enable_profile, stage
+from traj_render import make_renderer, project_episode, save_vector_overlay
+from video_io import probe_frame_count, stream_video
+
+
+DATASETS_ROOT = Path("/mnt/inspurfs/evla2_t/vla_next_next/data_process/datasets")
+VIDEO_KEY = "observation.images.image"
+
+# 每个进程内的渲染配置，由 init_worker 在进程启动时写入一次
+_worker = {}
+
+
+def init_worker(cameras, default_camera=None, renderer_kwargs=None, stream_kwargs=None, store_path=None, output="video"):
+    """Stores camera matrices and render settings for this process.
+
+    cameras maps task_index -> (intrinsic, extrinsic); default_camera is used
+    for episodes whose task_index is not in the map. renderer_kwargs are
+    passed to traj_render.make_renderer (window, overlay, antialias) and
+    stream_kwargs to video_io.stream_video (queue_size, fps, encoder_kwargs,
+    indices for rendering only a subset of frames).
+    If store_path is given, episodes are read from that EpisodeStore instead
+    of their parquet files. output="vector" writes traj_render vector
+    overlay files instead of videos.
+    """
+    _worker["cameras"] = cameras or {}
+    _worker["default_camera"] = default_camera
+    _worker["renderer_kwargs"] = renderer_kwargs or {}
+    _worker["stream_kwargs"] = stream_kwargs or {}
+    _worker["store"] = EpisodeStore(store_path) if store_path else None
+    _worker["output"] = output
+
+
+def _camera_for(task_index):
+    camera = _worker["cameras"].get(task_index, _worker["default_camera"])
+    if camera is None:
+        raise KeyError(f"no camera parameters for task_index {task_index}")
+    return camera
+
+
+def _load(parquet_path):
+    store = _worker["store"]
+    name = Path(parquet_path).stem
+    if store is not None and name in store:
+        return store.episode(name)
+    return load_episode(parquet_path)
+
+
+def temp_path_for(save_path):
+    """Hidden temp file next to save_path that keeps its suffix (imageio picks the format from it)."""
+    save_path = Path(save_path)
+    return save_path.with_name(f".{save_path.stem}.{os.getpid()}.tmp{save_path.suffix}")
+
+
+def render_episode(video_file, parquet_path, save_path):
+    """Renders the trajectory overlay of one episode and atomically moves it to save_path."""
+    name = Path(video_file).stem
+    with stage("render_episode", episode=name):
+        return _render_episode(video_file, parquet_path, save_path, name)
+
+
+def _render_episode(video_file, parquet_path, save_path, name):
+    with stage("load_episode", episode=name):
+        episode = _load(parquet_path)
+    intrinsic_matrix, agent_ex = _camera_for(episode.task_index)
+
+    with stage("projection", episode=name, frames=len(episode)):
+        traj = project_episode(episode.state, agent_ex, intrinsic_matrix)
+    tmp_path = temp_path_for(save_path)
+
+    if _worker["output"] == "vector":
+        # 不解码视频，只用容器头里的帧数核对长度
+        n_video = probe_frame_count(video_file)
+        if n_video is not None and n_video != len(episode):
+            raise ValueError("lenth of state must equal to lenth of frame")
+        try:
+            with stage("save_vector", episode=name, frames=len(episode)):
+                save_vector_overlay(tmp_path, traj, window=_worker["renderer_kwargs"].get("window", 32))
+            os.replace(tmp_path, save_path)
+        finally:
+            Path(tmp_path).unlink(missing_ok=True)
+        return save_path, len(episode)
+
+    renderer = make_renderer(traj, **_worker["renderer_kwargs"])
+    stream_kwargs = dict(_worker["stream_kwargs"])
+    if stream_kwargs.get("indices") is not None:
+        # 只渲染部分帧（预览/局部重画），超出 episode 长度的帧号丢弃
+        stream_kwargs["indices"] = [i for i in stream_kwargs["indices"] if i < len(episode)]
+    try:
+        # 解码/绘制/编码在三个线程里并行，只能整体计时；开启帧缓存时解码结果留给后面的转换阶段
+        with stage("stream_video", episode=name, frames=len(episode)):
+            n = stream_video(video_file, tmp_path, renderer.render, expected_len=len(traj.pixels), cached=True, **stream_kwargs)
+        os.replace(tmp_path, save_path)
+    finally:
+        Path(tmp_path).unlink(missing_ok=True)
+    return save_path, n
+
+
+def render_episodes(jobs, cameras=None, default_camera=None, renderer_kwargs=None, stream_kwargs=None, store_path=None, workers=1, manifest_path=None, output="video", resume=False):
+    """Renders (video_file, parquet_path, save_path) jobs, in a process pool when workers > 1.
+
+    Progress of all workers is aggregated into one tqdm bar. Failed episodes
+    are reported and returned instead of stopping the whole run. With
+    manifest_path, every finished episode is recorded, so an interrupted
+    run can be resumed; with resume=True as well, episodes whose inputs,
+    parameters and code version match an intact output from a previous run
+    are skipped.
+    """
+    jobs = list(jobs)
+    failed = []
+
+    manifest = None
+    fingerprints = {}
+    if manifest_path is not None:
+        manifest = RenderManifest(manifest_path)
+        encoder_settings = {k: v for k, v in (stream_kwargs or {}).items() if k != "queue_size"}
+        params = params_digest(
+            cameras=cameras, default_camera=default_camera, renderer_kwargs=renderer_kwargs, stream_kwargs=encoder_settings, output=output,
+        )
+        todo = []
+        for job in jobs:
+            fingerprint = job_fingerprint(job[0], job[1], params)
+            if resume and manifest.is_done(job[2], fingerprint):
+                continue
+            fingerprints[str(job[2])] = fingerprint
+            todo.append(job)
+        if resume:
+            print(f"manifest: {len(jobs) - len(todo)}/{len(jobs)} 已完成，跳过")
+        jobs = todo
+
+    def _done(save_path, n):
+        if manifest is not None:
+            manifest.record(save_path, fingerprints[str(save_path)], n)
+
+    bar = tqdm.tqdm(total=len(jobs))
+
+    if workers <= 1:
+        init_worker(cameras, default_camera, renderer_kwargs, stream_kwargs, store_path, output)
+        for job in jobs:
+            try:
+                _done(*render_episode(*job))
+            except Exception as e:
+                print(f"[failed] {job[0]}: {e!r}")
+                failed.append((job, e))
+            bar.update(1)
+        bar.close()
+        return failed
+
+    # 绘图脚本在模块顶层初始化环境，spawn 会重新执行整个脚本，这里固定用 fork
+    ctx = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=init_worker, initargs=(cameras, default_camera, renderer_kwargs, stream_kwargs, store_path, output)) as pool:
+        futures = {pool.submit(render_episode, *job): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                _done(*future.result())
+            except Exception as e:
+                print(f"[failed] {job[0]}: {e!r}")
+                failed.append((job, e))
+            bar.update(1)
+    bar.close()
+    return failed
+
+
+def add_render_arguments(parser):
+    """Adds the options shared by the draw_line_for_libero scripts to parser."""
+    parser.add_argument("--window", type=int, default=32, help="轨迹窗口长度（步数）")
+    parser.add_argument("--overlay", choices=["exact", "batched"], default="exact", help="exact: 与原始绘制逐像素一致; batched: 颜色分桶批量绘制（颜色有损）；只有 --window 约 128 以上时才比 exact 快，默认窗口下更慢，--antialias 还会再慢一倍左右")
+    parser.add_argument("--antialias", action="store_true", help="batched 模式下使用抗锯齿线条")
+    parser.add_argument("--output", choices=["video", "vector"], default="video", help="vector: 只保存投影后的轨迹数据(.npz)到 traj_vectors/，不重新编码视频")
+    parser.add_argument("--queue_size", type=int, default=8, help="解码/绘制/编码各阶段之间的队列长度")
+    parser.add_argument("--workers", type=int, default=1, help="每个 chunk 内并行渲染的进程数")
+    parser.add_argument("--chunks", type=int, nargs="+", default=None, help="只处理这些 chunk（按 meta/info.json 的 chunks_size 划分），默认全部")
+    parser.add_argument("--resume", action="store_true", help="根据 videos_traj/render_manifest.jsonl 跳过已完成且参数未变的 episode（每次运行总会记录完成的 episode）")
+    parser.add_argument("--frame_range", type=int, nargs=2, default=None, metavar=("START", "END"), help="只渲染 [START, END) 范围内的帧到 videos_traj_preview/，按关键帧跳转解码，不解码整个视频")
+    parser.add_argument("--fps", type=float, default=None, help="输出帧率，默认与源视频一致")
+    parser.add_argument("--encoder", choices=["imageio", "ffmpeg"], default="imageio", help="ffmpeg: 直接通过管道调用 ffmpeg，可调 preset/crf 等参数")
+    parser.add_argument("--preset", type=str, default="medium", help="x264 preset，如 ultrafast(预览) / slow(发布)")
+    parser.add_argument("--crf", type=int, default=23, help="x264 CRF，越小质量越高")
+    parser.add_argument("--encoder_threads", type=int, default=0, help="编码线程数，0 为自动")
+    parser.add_argument("--pix_fmt", type=str, default="yuv420p")
+    parser.add_argument("--gop", type=int, default=None, help="关键帧间隔")
+    parser.add_argument("--camera_cache", type=Path, default=DEFAULT_CACHE_PATH, help="相机内外参缓存文件，命中时无需启动 LIBERO 环境")
+    parser.add_argument("--profile", type=Path, default=None, help="把每个 episode 各阶段的耗时/CPU/峰值内存写到这个 JSONL 文件（stage_profile.py 可汇总）")
+    parser.add_argument("--frame_cache", type=Path, default=None, help="解码帧缓存目录（最好在本地 NVMe 上），渲染时把原视频的解码帧存成 .npy（--frame_range 只读已有条目），之后的转换/预览直接 memory-map")
+    parser.add_argument("--frame_cache_gb", type=float, default=DEFAULT_MAX_GB, help="帧缓存的大小上限，超出时淘汰最久未用的 episode")
+    parser.add_argument("--profile_top", type=int, default=0, help=">0 时同时开启 tracemalloc，记录每个阶段增长最多的分配位置")
+    return parser
+
+
+def parse_render_args(parser=None):
+    """Parses the shared options and turns on profiling / the frame cache if requested."""
+    args = add_render_arguments(parser or argparse.ArgumentParser()).parse_args()
+    if args.profile is not None:
+        enable_profile(args.profile, args.profile_top)
+    if args.frame_cache is not None:
+        enable_frame_cache(args.frame_cache, args.frame_cache_gb)
+    return args
+
+
+def render_suite(args, task_suite_name, cameras=None, default_camera=None):
+    """Draws the trajectories of every episode of a LIBERO suite into videos_traj/ (or traj_vectors/, videos_traj_preview/).
+
+    cameras maps task language -> (intrinsic, extrinsic); default_camera is
+    used for tasks that are not in it. Episodes are rendered chunk by chunk
+    through render_episodes, so every finished episode lands in the
+    manifest. Returns the failed (job, exception) pairs.
+    """
+    data_path = DATASETS_ROOT / f"{task_suite_name}_no_noops_1.0.0_lerobot"
+
+    # chunk 大小和 data/videos 路径模板都从 meta/info.json 读取，输出沿用同样的分块结构
+    layout = DatasetLayout(data_path)
+    # episode_store.py 预先打包的索引，存在且未过期时直接从中读取状态和任务映射
+    store = open_episode_store(data_path)
+    # scan_videos.py 检查出的坏视频，直接跳过
+    quarantine = load_quarantine(data_path)
+
+    if cameras:
+        lang_to_task = store.lang_to_task if store is not None else {v: k for k, v in load_tasks(data_path).items()}
+        cameras = {lang_to_task[lang]: camera for lang, camera in cameras.items() if lang in lang_to_task}
+
+    out_group = "videos_traj"
+    if args.output == "vector":
+        out_group = "traj_vectors"
+    if args.frame_range is not None:
+        out_group = "videos_traj_preview"
+    manifest_path = data_path / out_group / "render_manifest.jsonl"
+
+    def save_path_of(ref):
+        if args.output == "vector":
+            return layout.derived_file(out_group, ref, ".npz")
+        return layout.video_file(VIDEO_KEY, ref, group=out_group)
+
+    def chunk_jobs(refs):
+        """(video_file, parquet_path, save_path) of the episodes of one chunk, skipping quarantined/missing videos."""
+        jobs = []
+        for ref in refs:
+            if ref.name in quarantine:
+                continue
+            video_file = layout.video_file(VIDEO_KEY, ref)
+            if not video_file.exists():
+                print(f"{video_file} 不存在，跳过")
+                continue
+            jobs.append((video_file, ref.parquet_path, save_path_of(ref)))
+        if jobs and not jobs[0][2].parent.exists():
+            jobs[0][2].parent.mkdir(parents=True, exist_ok=True)
+            print("原路径不存在，以创建")
+            print(jobs[0][2].parent)
+        return jobs
+
+    chunks = layout.chunks()
+    if args.chunks is not None:
+        chunks = {c: refs for c, refs in chunks.items() if c in args.chunks}
+    print(f"{sum(len(refs) for refs in chunks.values())} 个 episode，{len(chunks)} 个 chunk")
+
+    renderer_kwargs = {"window": args.window, "overlay": args.overlay, "antialias": args.antialias}
+    encoder_kwargs = {"backend": args.encoder}
+    if args.encoder == "ffmpeg":
+        encoder_kwargs.update(preset=args.preset, crf=args.crf, threads=args.encoder_threads, pix_fmt=args.pix_fmt, gop=args.gop)
+    stream_kwargs = {"queue_size": args.queue_size, "fps": args.fps, "encoder_kwargs": encoder_kwargs}
+    if args.frame_range is not None:
+        stream_kwargs["indices"] = list(range(*args.frame_range))
+
+    # 边解码边画边编码，内存占用与episode长度无关；先写临时文件再改名，完成的 episode 记入 manifest
+    # 大数据集逐个 chunk 处理，每个 chunk 内按 episode 分到进程池
+    n_jobs, failed = 0, []
+    for chunk, refs in chunks.items():
+        jobs = chunk_jobs(refs)
+        print(f"chunk-{chunk:03d}: {len(jobs)} 个 episode")
+        n_jobs += len(jobs)
+        failed += render_episodes(
+            jobs, cameras=cameras, default_camera=default_camera, renderer_kwargs=renderer_kwargs, stream_kwargs=stream_kwargs,
+            store_path=store.path if store is not None else None, workers=args.workers,
+            manifest_path=manifest_path, resume=args.resume,
+            output=args.output,
+        )
+    print(f"完成 {n_jobs - len(failed)}/{n_jobs}，失败 {len(failed)}")
+    for job, e in failed:
+        print(job[0], e)
+    return failed
@@ -0,0 +1,176 @@
+import argparse
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+
+from dataset_layout import DatasetLayout
+from episode_loader import Episode, column_to_numpy, load_episode
+
+
+STORE_NAME = "episode_store.arrow"
+
+
+def default_store_path(dataset_root):
+    return Path(dataset_root) / "meta" / STORE_NAME
+
+
+def _source_stat(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _fixed_size_list(values):
+    values = np.ascontiguousarray(values, dtype=np.float32)
+    return pa.FixedSizeListArray.from_arrays(pa.array(values.reshape(-1)), values.shape[1])
+
+
+def _relative(path, dataset_root):
+    return path.relative_to(dataset_root).as_posix() if path.is_relative_to(dataset_root) else str(path)
+
+
+def load_tasks(dataset_root):
+    """Reads meta/tasks.jsonl into {task_index: language}."""
+    tasks = {}
+    with open(Path(dataset_root) / "meta" / "tasks.jsonl", "r", encoding="utf-8") as f:
+        for line in f:
+            task = json.loads(line)
+            tasks[task["task_index"]] = task["task"]
+    return tasks
+
+
+def build_episode_store(dataset_root, parquet_dir=None, out_path=None):
+    """Packs all episode parquets of a dataset into one Arrow IPC file.
+
+    Frames of all episodes are concatenated into fixed-size-list state/action
+    columns; per-episode offsets, lengths, task_index, source file stats and
+    the task_index -> language table are kept in the schema metadata.
+    Without parquet_dir, episodes of all chunks are found through meta/info.json.
+    """
+    dataset_root = Path(dataset_root)
+    out_path = Path(out_path) if out_path else default_store_path(dataset_root)
+
+    if parquet_dir:
+        parquet_dir = Path(parquet_dir)
+        parquet_files = sorted(parquet_dir.glob("*.parquet"))
+    else:
+        parquet_files = [ref.parquet_path for ref in DatasetLayout(dataset_root).episodes()]
+    states, actions, episodes = [], [], []
+    offset = 0
+    for parquet_file in parquet_files:
+        episode = load_episode(parquet_file)
+        states.append(episode.state)
+        actions.append(episode.action)
+        episodes.append({
+            "name": parquet_file.stem,
+            "offset": offset,
+            "length": len(episode),
+            "task_index": episode.task_index,
+            "episode_index": episode.episode_index,
+            "path": _relative(parquet_file, dataset_root),
+            "source": _source_stat(parquet_file),
+        })
+        offset += len(episode)
+    if not episodes:
+        raise FileNotFoundError(f"no parquet files under {parquet_dir or dataset_root}")
+
+    meta = {
+        # None: 按 meta/info.json 的分块结构查找
+        "parquet_dir": _relative(parquet_dir, dataset_root) if parquet_dir else None,
+        "episodes": episodes,
+        "tasks": {str(k): v for k, v in load_tasks(dataset_root).items()},
+    }
+    table = pa.table({
+        "state": _fixed_size_list(np.concatenate(states)),
+        "action": _fixed_size_list(np.concatenate(actions)),
+    }).replace_schema_metadata({"episode_store": json.dumps(meta, ensure_ascii=False)})
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_name(f".{out_path.name}.{os.getpid()}.tmp")
+    # 整张表写成一个 record batch，读取时每一列都是单块连续内存，可以零拷贝切片
+    with pa.OSFile(str(tmp_path), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=table.num_rows)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+class EpisodeStore:
+    """Memory-mapped view of a store written by build_episode_store."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._source = pa.memory_map(str(self.path), "r")
+        table = pa.ipc.open_file(self._source).read_all()
+        meta = json.loads(table.schema.metadata[b"episode_store"])
+
+        self.parquet_dir = meta["parquet_dir"]
+        self.episodes = meta["episodes"]
+        self.tasks = {int(k): v for k, v in meta["tasks"].items()}
+        # language -> task_index
+        self.lang_to_task = {v: k for k, v in self.tasks.items()}
+        self._by_name = {e["name"]: i for i, e in enumerate(self.episodes)}
+
+        self.state = column_to_numpy(table.column("state"))
+        self.action = column_to_numpy(table.column("action"))
+
+    def __len__(self):
+        return len(self.episodes)
+
+    def __contains__(self, name):
+        return name in self._by_name
+
+    @property
+    def names(self):
+        return [e["name"] for e in self.episodes]
+
+    def episode(self, key):
+        """Returns an Episode by position or by parquet stem, as zero-copy slices."""
+        meta = self.episodes[self._by_name[key] if isinstance(key, str) else key]
+        sl = slice(meta["offset"], meta["offset"] + meta["length"])
+        return Episode(self.state[sl], self.action[sl], meta["task_index"], meta["episode_index"])
+
+    def is_fresh(self, dataset_root):
+        """True if the source parquets are unchanged since the store was built."""
+        dataset_root = Path(dataset_root)
+        if self.parquet_dir is not None:
+            parquet_dir = dataset_root / self.parquet_dir
+            paths = {p.stem: p for p in parquet_dir.glob("*.parquet")}
+        else:
+            paths = {ref.name: ref.parquet_path for ref in DatasetLayout(dataset_root).episodes()}
+        if sorted(paths) != sorted(self._by_name):
+            return False
+        return all(_source_stat(paths[e["name"]]) == e["source"] for e in self.episodes)
+
+
+def open_episode_store(dataset_root, check_fresh=True):
+    """Opens the dataset's episode store, or returns None if it is missing or stale."""
+    path = default_store_path(dataset_root)
+    if not path.exists():
+        return None
+    store = EpisodeStore(path)
+    if check_fresh and not store.is_fresh(dataset_root):
+        print(f"{path} 已过期，请重新运行 episode_store.py")
+        return None
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--root",
+        type=Path,
+        required=True,
+        help="LeRobot dataset root (e.g. `.../libero_10_no_noops_1.0.0_lerobot`).",
+    )
+    parser.add_argument("--out", type=Path, default=None, help=f"Output file, defaults to `<root>/meta/{STORE_NAME}`.")
+    args = parser.parse_args()
+    out_path = build_episode_store(args.root, out_path=args.out)
+    store = EpisodeStore(out_path)
+    print(f"{out_path}: {len(store)} episodes, {len(store.state)} frames, {len(store.tasks)} tasks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+
+
+# 通过环境变量开启，spawn/fork 出来的子进程也会使用同一个缓存
+CACHE_ENV = "LIBERO_FRAME_CACHE"
+SIZE_ENV = "LIBERO_FRAME_CACHE_GB"
+DEFAULT_MAX_GB = 50
+
+
+class FrameCache:
+    """Decoded videos as (T, H, W, 3) uint8 .npy files, memory-mapped on later reads.
+
+    Entries are keyed by the video's resolved path, size and mtime, so a
+    re-encoded video is never served stale frames. Hits refresh the entry's
+    mtime; after each insert the least recently used entries are deleted
+    until the directory fits in max_bytes. Writes go through a temp file and
+    os.replace, so several processes can share one cache directory; an
+    evicted file stays readable for processes that already mapped it.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+    def path_for(self, video_path):
+        video_path = Path(video_path).resolve()
+        st = os.stat(video_path)
+        key = hashlib.sha1(f"{video_path}|{st.st_size}|{st.st_mtime_ns}".encode()).hexdigest()[:24]
+        return self.cache_dir / f"{key}.npy"
+
+    def get(self, video_path):
+        """Memory-mapped frames of video_path, or None on a miss."""
+        path = self.path_for(video_path)
+        try:
+            frames = np.load(path, mmap_mode="r")
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            # 文件损坏，当作未命中
+            path.unlink(missing_ok=True)
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # 刚被其他进程淘汰，已经映射的数据仍然可用
+            pass
+        return frames
+
+    def write_through(self, video_path, frames, n_frames):
+        """Yields `frames` unchanged while writing them into the cache entry of video_path.
+
+        Each frame is copied into a memory-mapped temp file as it passes
+        through, so the consumer never waits for the whole video. The entry
+        is published with os.replace only if exactly n_frames frames were
+        yielded; otherwise (wrong container header, consumer stopped early)
+        the temp file is discarded and nothing is cached.
+        """
+        path = self.path_for(video_path)
+        tmp_path = path.with_name(f".{path.stem}.{os.getpid()}.tmp.npy")
+        out = None
+        count = 0
+        try:
+            for frame in frames:
+                if count == 0:
+                    out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.uint8, shape=(n_frames, *frame.shape))
+                if out is not None:
+                    if count < n_frames and frame.shape == out.shape[1:]:
+                        out[count] = frame
+                    else:
+                        # 帧数或尺寸与预期不符：不再缓存，但继续输出已解码的帧
+                        out = None
+                count += 1
+                yield frame
+            if out is not None and count == n_frames:
+                out.flush()
+                out = None
+                os.replace(tmp_path, path)
+                self.evict(keep=path)
+        finally:
+            out = None
+            tmp_path.unlink(missing_ok=True)
+
+    def evict(self, keep=None):
+        """Deletes least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for path in self.cache_dir.glob("*.npy"):
+            if path.name.startswith("."):
+                continue
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def size(self):
+        return sum(p.stat().st_size for p in self.cache_dir.glob("*.npy") if not p.name.startswith("."))
+
+
+_cache = None
+_resolved = False
+
+
+def enable(cache_dir, max_gb=DEFAULT_MAX_GB):
+    """Turns the frame cache on for this process and for child processes started afterwards."""
+    global _cache, _resolved
+    os.environ[CACHE_ENV] = str(cache_dir)
+    os.environ[SIZE_ENV] = str(max_gb)
+    _cache = FrameCache(cache_dir, int(max_gb * 2**30))
+    _resolved = True
+    return _cache
+
+
+def get_cache():
+    global _cache, _resolved
+    if not _resolved:
+        _resolved = True
+        if os.environ.get(CACHE_ENV):
+            _cache = FrameCache(os.environ[CACHE_ENV], int(float(os.environ.get(SIZE_ENV, DEFAULT_MAX_GB)) * 2**30))
+    return _cache
@@ -0,0 +1,236 @@
+import argparse
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+# LeRobot v2.1 的目录结构，与 lerobot.datasets.utils 中的常量一致
+INFO_PATH = "meta/info.json"
+EPISODES_PATH = "meta/episodes.jsonl"
+EPISODES_STATS_PATH = "meta/episodes_stats.jsonl"
+TASKS_PATH = "meta/tasks.jsonl"
+# 源数据集 episode 名 -> 新 episode_index
+OLD_TO_NEW_PATH = "meta/old_to_new.jsonl"
+
+
+def read_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_jsonl(rows, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+def write_jsonl_atomic(rows, path):
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    write_jsonl(rows, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_old_to_new(root):
+    path = Path(root) / OLD_TO_NEW_PATH
+    return read_jsonl(path) if path.exists() else []
+
+
+def write_old_to_new(rows, root):
+    """Rewrites the whole old -> new index mapping of a converted dataset in one go."""
+    rows = sorted({r["new_index"]: r for r in rows}.values(), key=lambda r: r["new_index"])
+    write_jsonl_atomic(rows, Path(root) / OLD_TO_NEW_PATH)
+
+
+def write_info(info, root):
+    path = Path(root) / INFO_PATH
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=4, ensure_ascii=False)
+
+
+def _move(src, dst):
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.replace(src, dst)
+    except OSError:
+        # 跨文件系统时退化为复制
+        shutil.move(src, dst)
+
+
+def feature_stats(array, axis=0, keepdims=False):
+    """min/max/mean/std/count as lerobot's get_feature_stats computes them, as JSON lists."""
+    return {
+        "min": np.min(array, axis=axis, keepdims=keepdims).tolist(),
+        "max": np.max(array, axis=axis, keepdims=keepdims).tolist(),
+        "mean": np.mean(array, axis=axis, keepdims=keepdims).tolist(),
+        "std": np.std(array, axis=axis, keepdims=keepdims).tolist(),
+        "count": [len(array)],
+    }
+
+
+def _index_stats(values):
+    return feature_stats(np.asarray(values), axis=0, keepdims=True)
+
+
+def _episode_of(path):
+    return int(Path(path).stem.rsplit("_", 1)[-1])
+
+
+def truncate_to_complete(root):
+    """Cuts a v2.1 dataset left by an interrupted writer back to its complete episodes.
+
+    An episode is complete when it is listed in episodes.jsonl and
+    episodes_stats.jsonl and its parquet and all its videos exist; the
+    leading run of complete episodes is kept. Files of later episodes and
+    the temporary images/ directory are deleted, and meta/ is rewritten to
+    match. Returns the number of episodes kept.
+    """
+    root = Path(root)
+    info = json.loads((root / INFO_PATH).read_text(encoding="utf-8"))
+    episodes = sorted(read_jsonl(root / EPISODES_PATH), key=lambda r: r["episode_index"]) if (root / EPISODES_PATH).exists() else []
+    stats = {r["episode_index"]: r for r in read_jsonl(root / EPISODES_STATS_PATH)} if (root / EPISODES_STATS_PATH).exists() else {}
+    video_keys = [k for k, ft in info["features"].items() if ft["dtype"] == "video"]
+
+    n = 0
+    for episode in episodes:
+        chunk = n // info["chunks_size"]
+        files = [root / info["data_path"].format(episode_chunk=chunk, episode_index=n)]
+        files += [root / info["video_path"].format(episode_chunk=chunk, video_key=key, episode_index=n) for key in video_keys]
+        if episode["episode_index"] != n or n not in stats or not all(f.exists() for f in files):
+            break
+        n += 1
+    episodes = episodes[:n]
+
+    for path in list(root.glob("data/*/*.parquet")) + list(root.glob("videos/*/*/*.mp4")):
+        if _episode_of(path) >= n:
+            path.unlink()
+    shutil.rmtree(root / "images", ignore_errors=True)
+
+    used = {task for episode in episodes for task in episode["tasks"]}
+    tasks = sorted(read_jsonl(root / TASKS_PATH), key=lambda r: r["task_index"]) if (root / TASKS_PATH).exists() else []
+    tasks = [r for r in tasks if r["task"] in used]
+    info.update(
+        total_episodes=n,
+        total_frames=sum(e["length"] for e in episodes),
+        total_tasks=len(tasks),
+        total_videos=n * len(video_keys),
+        total_chunks=-(-n // info["chunks_size"]),
+        splits={"train": f"0:{n}"} if n else {},
+    )
+    write_jsonl_atomic(episodes, root / EPISODES_PATH)
+    write_jsonl_atomic([stats[i] for i in range(n)], root / EPISODES_STATS_PATH)
+    write_jsonl_atomic(tasks, root / TASKS_PATH)
+    write_info(info, root)
+    return n
+
+
+def merge_datasets(shard_roots, out_root, move=True):
+    """Merges LeRobot v2.1 datasets written by disjoint workers into one dataset.
+
+    Shards are concatenated in the given order: episode_index, index and
+    task_index are renumbered as if all episodes had been added to one
+    dataset, parquet files are rewritten, videos are moved (or copied with
+    move=False), and meta/ (info, episodes, episodes_stats, tasks) is
+    rebuilt. With contiguous shards the result matches the serial
+    conversion.
+    """
+    shard_roots = [Path(r) for r in shard_roots]
+    out_root = Path(out_root)
+    if out_root.exists() and any(out_root.iterdir()):
+        raise FileExistsError(f"{out_root} is not empty")
+
+    info = None
+    tasks = {}  # task -> 新 task_index，按首次出现的顺序编号，与串行写入一致
+    episodes, episodes_stats = [], []
+    n_frames = 0
+
+    for root in shard_roots:
+        shard_info = json.loads((root / INFO_PATH).read_text(encoding="utf-8"))
+        if info is None:
+            info = shard_info
+        elif shard_info["features"].keys() != info["features"].keys() or shard_info["fps"] != info["fps"]:
+            raise ValueError(f"{root} has different features/fps than {shard_roots[0]}")
+        chunks_size = shard_info["chunks_size"]
+        video_keys = [k for k, ft in shard_info["features"].items() if ft["dtype"] == "video"]
+
+        task_map = {}
+        for row in sorted(read_jsonl(root / TASKS_PATH), key=lambda r: r["task_index"]):
+            task_map[row["task_index"]] = tasks.setdefault(row["task"], len(tasks))
+        shard_stats = {row["episode_index"]: row["stats"] for row in read_jsonl(root / EPISODES_STATS_PATH)}
+
+        for episode in sorted(read_jsonl(root / EPISODES_PATH), key=lambda r: r["episode_index"]):
+            old, new = episode["episode_index"], len(episodes)
+            old_chunk, new_chunk = old // chunks_size, new // info["chunks_size"]
+
+            src = root / shard_info["data_path"].format(episode_chunk=old_chunk, episode_index=old)
+            table = pq.read_table(src)
+            length = table.num_rows
+            columns = {
+                "episode_index": np.full(length, new, dtype=np.int64),
+                "index": np.arange(n_frames, n_frames + length, dtype=np.int64),
+                "task_index": np.array([task_map[t] for t in table.column("task_index").to_pylist()], dtype=np.int64),
+            }
+            for name, values in columns.items():
+                i = table.schema.get_field_index(name)
+                field = table.schema.field(i)
+                table = table.set_column(i, field, pa.array(values, type=field.type))
+            dst = out_root / info["data_path"].format(episode_chunk=new_chunk, episode_index=new)
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            pq.write_table(table, dst)
+
+            for key in video_keys:
+                src = root / shard_info["video_path"].format(episode_chunk=old_chunk, video_key=key, episode_index=old)
+                dst = out_root / info["video_path"].format(episode_chunk=new_chunk, video_key=key, episode_index=new)
+                if move:
+                    _move(src, dst)
+                else:
+                    dst.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.copy2(src, dst)
+
+            stats = dict(shard_stats[old])
+            for name, values in columns.items():
+                if name in stats:
+                    stats[name] = _index_stats(values)
+            episodes.append(dict(episode, episode_index=new))
+            episodes_stats.append({"episode_index": new, "stats": stats})
+            n_frames += length
+
+    if info is None:
+        raise ValueError("no shards to merge")
+    n_video_keys = sum(ft["dtype"] == "video" for ft in info["features"].values())
+    info.update(
+        total_episodes=len(episodes),
+        total_frames=n_frames,
+        total_tasks=len(tasks),
+        total_videos=len(episodes) * n_video_keys,
+        total_chunks=-(-len(episodes) // info["chunks_size"]),
+        splits={"train": f"0:{len(episodes)}"},
+    )
+    write_info(info, out_root)
+    write_jsonl(episodes, out_root / EPISODES_PATH)
+    write_jsonl(episodes_stats, out_root / EPISODES_STATS_PATH)
+    write_jsonl([{"task_index": i, "task": t} for t, i in tasks.items()], out_root / TASKS_PATH)
+    return out_root
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shards", type=Path, nargs="+", required=True, help="要合并的 LeRobot 数据集，按顺序拼接")
+    parser.add_argument("--out", type=Path, required=True)
+    parser.add_argument("--copy", action="store_true", help="复制视频而不是移动，保留分片")
+    args = parser.parse_args()
+    merge_datasets(args.shards, args.out, move=not args.copy)
+    info = json.loads((args.out / INFO_PATH).read_text(encoding="utf-8"))
+    print(f"{args.out}: {info['total_episodes']} episodes, {info['total_frames']} frames, {info['total_tasks']} tasks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from lerobot_merge import EPISODES_PATH, EPISODES_STATS_PATH, TASKS_PATH, feature_stats, write_info, write_jsonl
+from video_io import FrameReader, probe_frame_count, remux_video, video_info
+
+
+CODEBASE_VERSION = "v2.1"
+CHUNKS_SIZE = 1000
+DATA_PATH = "data/chunk-{episode_chunk:03d}/episode_{episode_index:06d}.parquet"
+VIDEO_PATH = "videos/chunk-{episode_chunk:03d}/{video_key}/episode_{episode_index:06d}.mp4"
+
+# LeRobotDataset.create 自动加入的列
+DEFAULT_FEATURES = {
+    "timestamp": {"dtype": "float32", "shape": (1,), "names": None},
+    "frame_index": {"dtype": "int64", "shape": (1,), "names": None},
+    "episode_index": {"dtype": "int64", "shape": (1,), "names": None},
+    "index": {"dtype": "int64", "shape": (1,), "names": None},
+    "task_index": {"dtype": "int64", "shape": (1,), "names": None},
+}
+
+
+def sample_indices(length, min_samples=100, max_samples=10_000, power=0.75):
+    """Frame indices lerobot samples for image stats (compute_stats.sample_indices)."""
+    n = max(min(min_samples, length), min(int(length**power), max_samples))
+    return np.round(np.linspace(0, length - 1, n)).astype(int).tolist()
+
+
+def image_stats(video_path, length):
+    """Per-channel image stats of a video over lerobot's sampled frames, normalized to [0, 1]."""
+    with FrameReader(video_path) as reader:
+        images = reader.get_frames(sample_indices(length))
+    images = images.transpose(0, 3, 1, 2)
+    if max(images.shape[2:]) >= 300:
+        step = images.shape[3] // 150 if images.shape[3] > images.shape[2] else images.shape[2] // 150
+        images = images[:, :, ::step, ::step]
+    stats = feature_stats(images, axis=(0, 2, 3), keepdims=True)
+    # (1, C, 1, 1) -> (C, 1, 1)，归一化到 [0, 1]
+    return {k: v if k == "count" else (np.array(v)[0] / 255.0).tolist() for k, v in stats.items()}
+
+
+def _arrow_schema(features):
+    """Arrow schema (with the `huggingface` metadata) that datasets would write for these features."""
+    import datasets
+
+    hf_features = {}
+    for key, ft in features.items():
+        if ft["dtype"] == "video":
+            continue
+        if tuple(ft["shape"]) == (1,):
+            hf_features[key] = datasets.Value(dtype=ft["dtype"])
+        elif len(ft["shape"]) == 1:
+            hf_features[key] = datasets.Sequence(length=ft["shape"][0], feature=datasets.Value(dtype=ft["dtype"]))
+        else:
+            raise ValueError(f"unsupported feature for remux: {key} {ft}")
+    return datasets.Features(hf_features).arrow_schema
+
+
+def episode_table(episode, schema, episode_index, index_offset, task_index, fps):
+    length = len(episode)
+    columns = {
+        "observation.state": episode.state,
+        "action": episode.action,
+        "timestamp": (np.arange(length) / fps).astype(np.float32),
+        "frame_index": np.arange(length, dtype=np.int64),
+        "episode_index": np.full(length, episode_index, dtype=np.int64),
+        "index": np.arange(index_offset, index_offset + length, dtype=np.int64),
+        "task_index": np.full(length, task_index, dtype=np.int64),
+    }
+    arrays = []
+    for field in schema:
+        values = columns[field.name]
+        if pa.types.is_fixed_size_list(field.type):
+            values = np.ascontiguousarray(values, dtype=field.type.value_type.to_pandas_dtype())
+            flat = pa.array(values.reshape(-1), type=field.type.value_type)
+            arrays.append(pa.FixedSizeListArray.from_arrays(flat, field.type.list_size))
+        else:
+            arrays.append(pa.array(values, type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema), columns
+
+
+def _place_video(src, dst, video_mode):
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(f".{dst.stem}.{os.getpid()}.tmp{dst.suffix}")
+    try:
+        if video_mode == "remux":
+            remux_video(src, tmp)
+        else:
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def write_remuxed_dataset(local_dir, jobs, features, fps, robot_type=None, video_mode="copy"):
+    """Writes a LeRobot v2.1 dataset from already-encoded per-episode videos, without transcoding.
+
+    jobs yields (episode, task, {video_key: source mp4}) in output order.
+    Source videos are copied (or remuxed with video_mode="remux") straight to
+    videos/chunk-XXX/<key>/episode_XXXXXX.mp4; only the parquet data and
+    meta/ are generated. Videos must already have the episode's length and
+    the dataset fps. Returns the number of episodes written.
+    """
+    local_dir = Path(local_dir)
+    features = {**features, **DEFAULT_FEATURES}
+    video_keys = [k for k, ft in features.items() if ft["dtype"] == "video"]
+    schema = _arrow_schema(features)
+
+    tasks, episodes, episodes_stats = {}, [], []
+    n_frames = 0
+    for episode_index, (episode, task, videos) in enumerate(jobs):
+        length = len(episode)
+        for key in video_keys:
+            if probe_frame_count(videos[key]) != length:
+                raise ValueError("lenth of state must equal to lenth of frame")
+            if video_info(videos[key])["video.fps"] != fps:
+                raise ValueError(f"{videos[key]} is not {fps} fps, it has to be re-encoded")
+
+        chunk = episode_index // CHUNKS_SIZE
+        task_index = tasks.setdefault(task, len(tasks))
+        table, columns = episode_table(episode, schema, episode_index, n_frames, task_index, fps)
+        data_path = local_dir / DATA_PATH.format(episode_chunk=chunk, episode_index=episode_index)
+        data_path.parent.mkdir(parents=True, exist_ok=True)
+        pq.write_table(table, data_path)
+
+        stats = {}
+        for key in video_keys:
+            _place_video(videos[key], local_dir / VIDEO_PATH.format(episode_chunk=chunk, video_key=key, episode_index=episode_index), video_mode)
+            stats[key] = image_stats(videos[key], length)
+        for key, values in columns.items():
+            stats[key] = feature_stats(values, axis=0, keepdims=values.ndim == 1)
+
+        episodes.append({"episode_index": episode_index, "tasks": [task], "length": length})
+        episodes_stats.append({"episode_index": episode_index, "stats": stats})
+        n_frames += length
+
+    info_features = {k: dict(ft, shape=list(ft["shape"])) for k, ft in features.items()}
+    if episodes:
+        # 和 LeRobot 一样，用第一个 episode 的视频填写视频参数
+        for key in video_keys:
+            info_features[key]["info"] = video_info(local_dir / VIDEO_PATH.format(episode_chunk=0, video_key=key, episode_index=0))
+    info = {
+        "codebase_version": CODEBASE_VERSION,
+        "robot_type": robot_type,
+        "total_episodes": len(episodes),
+        "total_frames": n_frames,
+        "total_tasks": len(tasks),
+        "total_videos": len(episodes) * len(video_keys),
+        "total_chunks": -(-len(episodes) // CHUNKS_SIZE),
+        "chunks_size": CHUNKS_SIZE,
+        "fps": fps,
+        "splits": {"train": f"0:{len(episodes)}"},
+        "data_path": DATA_PATH,
+        "video_path": VIDEO_PATH,
+        "features": info_features,
+    }
+    write_info(info, local_dir)
+    write_jsonl(episodes, local_dir / EPISODES_PATH)
+    write_jsonl(episodes_stats, local_dir / EPISODES_STATS_PATH)
+    write_jsonl([{"task_index": i, "task": t} for t, i in tasks.items()], local_dir / TASKS_PATH)
+    return len(episodes)
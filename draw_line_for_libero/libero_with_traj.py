@@ -1,13 +1,28 @@
 import argparse
+import multiprocessing
+import os
 import re
 import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 from functools import partial
 from pathlib import Path
-import imageio
 import numpy as np
 from lerobot.datasets.lerobot_dataset import LeRobotDataset
-from lerobot.datasets.utils import load_jsonlines,append_jsonlines
-from datasets import Dataset
+from lerobot.datasets.video_utils import VideoEncodingManager
+
+from camera_cache import DEFAULT_CACHE_PATH, get_camera_params
+from dataset_layout import DatasetLayout
+from episode_loader import load_episode
+from episode_store import EpisodeStore, load_tasks, open_episode_store
+from frame_cache import DEFAULT_MAX_GB, enable as enable_frame_cache
+from lerobot_merge import load_old_to_new, merge_datasets, truncate_to_complete, write_old_to_new
+from lerobot_remux import write_remuxed_dataset
+from scan_videos import load_quarantine
+from stage_profile import enable as enable_profile, profile_iter, stage
+from traj_render import make_renderer, project_episode
+from video_io import iter_lockstep, threaded
 np.set_printoptions(precision=2)
 
 features= {
@@ -83,86 +98,374 @@ features= {
     },
 }
 
-def get_video(video_path):
-    # read video
-    reader = imageio.get_reader(video_path)
-    # 获取视频的元信息
-    print("帧率:", reader.get_meta_data()['fps'])
-    print("总帧数:", reader.count_frames())
 
-    imgs = []
-    for i, frame in enumerate(reader):
-        # print("Frame", i, frame.shape)  # frame 是一个 numpy 数组
-        imgs.append(np.array(frame))
-    reader.close()    
-    return imgs
+def list_episodes(raw_dir: Path, include_outputs=True, store=None):
+    """Parquet files to convert in output order (quarantined episodes dropped) and the task table.
+
+    include_outputs=False keeps episodes whose videos_traj file is bad, for
+    conversions that draw the overlay themselves. store is the dataset's
+    EpisodeStore, if it has a fresh one.
+    """
+    # 所有 chunk 的 episode，路径模板来自 meta/info.json
+    episodes = DatasetLayout(raw_dir).by_name()
+    if store is not None:
+        task_index_to_name = store.tasks
+        names = store.names
+    else:
+        task_index_to_name = load_tasks(raw_dir)
+        names = list(episodes)
+    # scan_videos.py 检查出的坏视频（含坏的轨迹视频），直接跳过
+    quarantine = load_quarantine(raw_dir, include_outputs=include_outputs)
+    parquet_files = []
+    for name in names:
+        if name in quarantine:
+            print(f"skip quarantined:{episodes[name].parquet_path}")
+            continue
+        parquet_files.append(episodes[name].parquet_path)
+    return parquet_files, task_index_to_name
+
+
+def traj_cameras(raw_dir: Path, task_suite_name=None, camera_cache=DEFAULT_CACHE_PATH):
+    """Task language -> (intrinsic, extrinsic) of the agentview camera, for drawing the overlay during conversion."""
+    if task_suite_name is None:
+        # 数据集目录名形如 libero_10_no_noops_1.0.0_lerobot
+        match = re.match(r"(libero_\w+?)_no_noops", raw_dir.name)
+        if match is None:
+            raise ValueError(f"cannot infer the task suite from {raw_dir.name}, pass --task-suite-name")
+        task_suite_name = match.group(1)
+    return {
+        language: (intrinsic, extrinsic)
+        for language, intrinsic, extrinsic in get_camera_params(task_suite_name, None, 256, "agentview", 7, camera_cache)
+    }
+
+
+def source_videos(layout, ref):
+    """Source mp4 of each output video key of an episode, in the source dataset's chunked layout."""
+    return {
+        "observation.images.image": layout.video_file("observation.images.image", ref),
+        "observation.images.wrist_image": layout.video_file("observation.images.wrist_image", ref),
+        "observation.images.image_traj": layout.video_file("observation.images.image", ref, group="videos_traj"),
+    }
+
+
+def iter_episodes(raw_dir: Path, parquet_files, store=None, prefetch=0, cameras=None, renderer_kwargs=None):
+    """Yields (parquet_file, episode, frames), frames being (image, wrist_image, image_traj) tuples.
+
+    With prefetch=0 the videos are streamed in lockstep while the caller
+    consumes them. With prefetch > 0 a background thread fully decodes
+    upcoming episodes while the caller is busy (e.g. in save_episode); at
+    most `prefetch` of them (the one being decoded included) exist besides
+    the episode the caller holds, trading memory for overlap. With cameras
+    (task_index -> (intrinsic, extrinsic)), image_traj is drawn in memory
+    from the decoded image frame instead of being read from videos_traj/.
+    """
+    layout = DatasetLayout(raw_dir)
+    episodes = layout.by_name()
+
+    def _open(parquet_file):
+        video1_path, video2_path, video3_path = source_videos(layout, episodes[parquet_file.stem]).values()
+        if store is not None:
+            traj = store.episode(parquet_file.stem)
+        else:
+            traj = load_episode(parquet_file)
+        if cameras is None:
+            # 三路视频各自在后台线程解码，逐帧同步，长度不一致时立即报错；原视频可以从帧缓存读
+            return parquet_file, traj, iter_lockstep([video1_path, video2_path, video3_path], expected_len=len(traj), cached=[True, False, False])
+
+        # 一次解码原视频，直接在内存里画轨迹，不经过 videos_traj 的中间文件
+        if traj.task_index not in cameras:
+            raise KeyError(f"no camera parameters for task_index {traj.task_index}")
+        intrinsic_matrix, agent_ex = cameras[traj.task_index]
+        renderer = make_renderer(project_episode(traj.state, agent_ex, intrinsic_matrix), **(renderer_kwargs or {}))
+        frames = iter_lockstep([video1_path, video2_path], expected_len=len(traj), cached=[True, False])
+        return parquet_file, traj, ((image, wrist_image, renderer.render(image, i)) for i, (image, wrist_image) in enumerate(frames))
+
+    if prefetch <= 0:
+        for parquet_file in parquet_files:
+            yield _open(parquet_file)
+        return
+
+    def _load(parquet_file):
+        parquet_file, traj, frames = _open(parquet_file)
+        return parquet_file, traj, list(frames)
+
+    # 生产者开始解码前先拿一个名额，调用方取走 episode 时归还：
+    # 队列里的、正在解码的合计不超过 prefetch 个，另加调用方手里的一个
+    slots = threading.Semaphore(prefetch)
+    closed = threading.Event()
+
+    def _loaded():
+        for parquet_file in parquet_files:
+            slots.acquire()
+            if closed.is_set():
+                return
+            yield _load(parquet_file)
 
+    loaded = threaded(_loaded(), maxsize=prefetch)
+    try:
+        for item in loaded:
+            slots.release()
+            yield item
+    finally:
+        # 唤醒可能在等名额的生产者，让它直接退出
+        closed.set()
+        slots.release()
+        loaded.close()
 
-def save_as_lerobot_dataset(lerobot_dataset: LeRobotDataset, libero_parquet_dir: Path):
+
+def save_as_lerobot_dataset(lerobot_dataset: LeRobotDataset, raw_dir: Path, parquet_files=None, start_index=0, mapping=None, prefetch=0, cameras=None, renderer_kwargs=None, store=None):
+    """Adds episodes to lerobot_dataset; parquet_files defaults to every episode of the source dataset.
+
+    start_index is the episode index the first file gets in the final
+    dataset. If mapping is a list, an old -> new index row is appended to it
+    after each episode has been saved. store (the dataset's EpisodeStore,
+    opened once by the caller), prefetch, cameras and renderer_kwargs are
+    passed to iter_episodes.
+    """
     # breakpoint()
-    index = 0
-    task_index_to_name = load_jsonlines(str(libero_parquet_dir.parent.parent / "meta" / "tasks.jsonl"))
-    for parquet_file in libero_parquet_dir.iterdir():
+    index = start_index
+    if parquet_files is None:
+        parquet_files, task_index_to_name = list_episodes(raw_dir, include_outputs=cameras is None, store=store)
+    else:
+        task_index_to_name = store.tasks if store is not None else load_tasks(raw_dir)
+    # load_episode 记录的是等待下一个 episode 的时间（预取时只有队列空了才会等）
+    t_wait = time.perf_counter()
+    for parquet_file, traj, frames in profile_iter(iter_episodes(raw_dir, parquet_files, store, prefetch, cameras, renderer_kwargs), "load_episode"):
+        t_add = time.perf_counter()
         print(f"old:{parquet_file}")
         print(f"new:{index}")
-        old_to_new_index_path = libero_parquet_dir.parent.parent /"meta"/ "old_to_new.jsonl"
-        print(old_to_new_index_path)
-        append_jsonlines({"new_index":index,"old_index":parquet_file.stem},old_to_new_index_path)
+
+        # prefetch=0 时这里包含三路视频的解码
+        with stage("add_frames", episode=parquet_file.stem, frames=len(traj)):
+            for i, (image, wrist_image, image_traj) in enumerate(frames):
+                image_dict = {
+                    "observation.images.image": image,
+                    "observation.images.wrist_image": wrist_image,
+                    "observation.images.image_traj": image_traj,
+                }     
+
+                lerobot_dataset.add_frame(
+                    {   **image_dict,
+                        "observation.state": traj.state[i],
+                        "action": traj.action[i],
+                    },
+                    task=task_index_to_name[traj.task_index],
+                )
+        t_save = time.perf_counter()
+        with stage("save_episode", episode=parquet_file.stem, frames=len(traj)):
+            lerobot_dataset.save_episode()
+        t_end = time.perf_counter()
+        # batch_encoding_size > 1 时，凑满一批的那个 episode 的 save_episode 包含整批视频的编码
+        encoded = "，含批量编码" if lerobot_dataset.batch_encoding_size > 1 and lerobot_dataset.episodes_since_last_encoding == 0 else ""
+        print(
+            f"episode {index}: {len(traj)} 帧，等待 {t_add - t_wait:.2f}s，add_frame {t_save - t_add:.2f}s，"
+            f"save_episode {t_end - t_save:.2f}s{encoded}，{len(traj) / (t_end - t_wait):.1f} 帧/s"
+        )
+        if mapping is not None:
+            mapping.append({"new_index": index, "old_index": parquet_file.stem})
         index += 1
+        t_wait = time.perf_counter()
+
+
+FPS = 20
+ROBOT_TYPE = "franka"
+
+
+def default_image_writer_threads(workers=1, processes=0):
+    """4 threads per camera as LeRobot recommends, capped at this process's share of the cores.
+
+    With image writer processes the threads are per process, so the total
+    is split between them.
+    """
+    n_cameras = sum(ft["dtype"] in ("image", "video") for ft in features.values())
+    return max(1, min(4 * n_cameras, (os.cpu_count() or 1) // workers) // max(processes, 1))
+
+
+def open_lerobot_dataset(repo_id, root: Path, n_episodes, writer_kwargs=None, resume=False):
+    """Creates (or reopens with resume=True) the output dataset with the image writer / batch encoding options.
+
+    writer_kwargs holds image_writer_processes, image_writer_threads and
+    batch_encoding_size; batch_encoding_size=0 defers all video encoding
+    until the n_episodes episodes of this run have been saved.
+    """
+    writer_kwargs = writer_kwargs or {}
+    processes = writer_kwargs.get("image_writer_processes", 0)
+    threads = writer_kwargs.get("image_writer_threads", 0)
+    batch_encoding_size = writer_kwargs.get("batch_encoding_size", 1)
+    if batch_encoding_size == 0:
+        batch_encoding_size = max(n_episodes, 1)
+    if resume:
+        lerobot_dataset = LeRobotDataset(repo_id, root=root, batch_encoding_size=batch_encoding_size)
+        if processes or threads:
+            lerobot_dataset.start_image_writer(processes, threads)
+        return lerobot_dataset
+    return LeRobotDataset.create(
+        repo_id=repo_id,
+        robot_type=ROBOT_TYPE,
+        root=root,
+        fps=FPS,
+        features=features,
+        image_writer_processes=processes,
+        image_writer_threads=threads,
+        batch_encoding_size=batch_encoding_size,
+    )
 
-        ### get image
-        video1_path = libero_parquet_dir.parent.parent / "videos/chunk-000" / "observation.images.image" / f"{parquet_file.stem}.mp4"
-        video2_path = libero_parquet_dir.parent.parent / "videos/chunk-000" / "observation.images.wrist_image" / f"{parquet_file.stem}.mp4"
-        video3_path = libero_parquet_dir.parent.parent / "videos_traj/chunk-000" / "observation.images.image" / f"{parquet_file.stem}.mp4"
 
-        video1 = get_video(video1_path)
-        video2 = get_video(video2_path)
-        video3 = get_video(video3_path)
+def encode_pending_videos(lerobot_dataset: LeRobotDataset):
+    """Encodes the videos of episodes still waiting for their batch."""
+    n = lerobot_dataset.episodes_since_last_encoding
+    if n == 0:
+        return
+    start = time.perf_counter()
+    with stage("batch_encode", episodes=n):
+        lerobot_dataset.batch_encode_videos(lerobot_dataset.num_episodes - n, lerobot_dataset.num_episodes)
+    lerobot_dataset.episodes_since_last_encoding = 0
+    print(f"编码剩余 {n} 个 episode 的视频：{time.perf_counter() - start:.2f}s")
 
 
-        traj = Dataset.from_parquet(str(parquet_file))
-        for i in range(len(traj["action"])):
-            image_dict = {
-                "observation.images.image": video1[i],
-                "observation.images.wrist_image": video2[i],
-                "observation.images.image_traj": video3[i],
-            }     
+def convert_episodes(lerobot_dataset: LeRobotDataset, raw_dir: Path, parquet_files, start_index=0, mapping=None, prefetch=0, cameras=None, renderer_kwargs=None, store=None):
+    """save_as_lerobot_dataset, then encodes the last partial batch and stops the image writer.
 
-            lerobot_dataset.add_frame(
-                {   **image_dict,
-                    "observation.state": np.array(traj["observation.state"][i], dtype=np.float32),
-                    "action": np.array(traj["action"][i], dtype=np.float32),
-                },
-                task=task_index_to_name[traj["task_index"][0]]["task"],
-            )
-        lerobot_dataset.save_episode()
+    VideoEncodingManager also encodes the saved episodes if the conversion
+    fails halfway, like lerobot's record does.
+    """
+    try:
+        with VideoEncodingManager(lerobot_dataset):
+            save_as_lerobot_dataset(lerobot_dataset, raw_dir, parquet_files, start_index, mapping, prefetch, cameras, renderer_kwargs, store)
+            encode_pending_videos(lerobot_dataset)
+    finally:
+        lerobot_dataset.stop_image_writer()
+
+
+def _convert_shard(raw_dir: Path, shard_root: Path, repo_id, parquet_files, start_index, prefetch=0, cameras=None, renderer_kwargs=None, writer_kwargs=None, store_path=None):
+    # 父进程已经检查过 store 是否过期，这里直接 memory-map
+    store = EpisodeStore(store_path) if store_path else None
+    lerobot_dataset = open_lerobot_dataset(repo_id, shard_root, len(parquet_files), writer_kwargs)
+    convert_episodes(lerobot_dataset, raw_dir, parquet_files, start_index, prefetch=prefetch, cameras=cameras, renderer_kwargs=renderer_kwargs, store=store)
+    return shard_root
 
 
 def create_lerobot_dataset(
     raw_dir: Path,
     repo_id: str = None,
     local_dir: Path = None,
+    workers: int = 1,
+    video_mode: str = "encode",
+    overwrite: bool = False,
+    prefetch: int = 0,
+    cameras=None,
+    renderer_kwargs=None,
+    writer_kwargs=None,
 ):
-    
+    """Converts raw_dir into local_dir/<raw_dir.name>; cameras maps task language -> (intrinsic, extrinsic) for --draw-traj."""
     local_dir /= raw_dir.name
-    if local_dir.exists():
+    writer_kwargs = dict(writer_kwargs or {})
+    if writer_kwargs.get("image_writer_threads") is None:
+        writer_kwargs["image_writer_threads"] = default_image_writer_threads(workers, writer_kwargs.get("image_writer_processes", 0))
+    if overwrite and local_dir.exists():
         shutil.rmtree(local_dir)
 
-    fps = 20
-    robot_type = "franka"
+    if cameras is not None and video_mode != "encode":
+        raise ValueError("画轨迹需要重新编码，不能和 copy/remux 一起使用")
 
-    lerobot_dataset = LeRobotDataset.create(
-        repo_id=repo_id,
-        robot_type=robot_type,
-        root=local_dir,
-        fps=int(fps),
-        features=features,
-    )
+    # episode_store.py 预先打包的索引：整个转换只打开并检查一次，再传给各个阶段
+    store = open_episode_store(raw_dir)
+    if cameras is not None:
+        lang_to_task = store.lang_to_task if store is not None else {v: k for k, v in load_tasks(raw_dir).items()}
+        cameras = {lang_to_task[language]: camera for language, camera in cameras.items() if language in lang_to_task}
+    if video_mode != "encode" or workers > 1:
+        if local_dir.exists():
+            raise FileExistsError(f"{local_dir} 已存在，copy/remux 和多进程模式不支持断点续转，请加 --overwrite")
+        if video_mode != "encode":
+            create_lerobot_dataset_remux(raw_dir, local_dir, video_mode, store)
+        else:
+            create_lerobot_dataset_sharded(raw_dir, repo_id, local_dir, workers, prefetch, cameras, renderer_kwargs, writer_kwargs, store)
+        return
+
+    parquet_files, _ = list_episodes(raw_dir, include_outputs=cameras is None, store=store)
+    # 断点续转：输出目录里已有的完整 episode 保留，中断时写了一半的 episode 删除
+    n_done = truncate_to_complete(local_dir) if (local_dir / "meta/info.json").exists() else 0
+    if n_done == 0:
+        shutil.rmtree(local_dir, ignore_errors=True)
+
+    mapping = [r for r in load_old_to_new(local_dir) if r["new_index"] < n_done]
+    done = {r["old_index"] for r in mapping}
+    pending = [p for p in parquet_files if p.stem not in done]
+    if len(mapping) < n_done:
+        # 上次运行被强制结束，映射没来得及写：按转换顺序补齐
+        missing = n_done - len(mapping)
+        print(f"old_to_new 缺少 {missing} 条记录，按转换顺序补齐")
+        mapping += [{"new_index": len(mapping) + k, "old_index": p.stem} for k, p in enumerate(pending[:missing])]
+        pending = pending[missing:]
+    print(f"已完成 {n_done} 个 episode，剩余 {len(pending)} 个")
+    print(f"image writer: {writer_kwargs.get('image_writer_processes', 0)} 进程 x {writer_kwargs['image_writer_threads']} 线程，batch_encoding_size={writer_kwargs.get('batch_encoding_size', 1)}")
+
+    lerobot_dataset = open_lerobot_dataset(repo_id, local_dir, len(pending), writer_kwargs, resume=n_done > 0)
+    try:
+        convert_episodes(lerobot_dataset, raw_dir, pending, start_index=n_done, mapping=mapping, prefetch=prefetch, cameras=cameras, renderer_kwargs=renderer_kwargs, store=store)
+    finally:
+        # 每次运行结束时整体写一次映射，不在源数据集里追加
+        write_old_to_new(mapping, local_dir)
 
-    libero_parquet_dir = raw_dir / "data/chunk-000"
-    save_as_lerobot_dataset(lerobot_dataset, libero_parquet_dir)
 
+def create_lerobot_dataset_remux(raw_dir: Path, local_dir: Path, video_mode, store=None):
+    """Writes the dataset from the existing mp4s (copied or remuxed), generating only parquet data and meta/."""
+    parquet_files, task_index_to_name = list_episodes(raw_dir, store=store)
+    layout = DatasetLayout(raw_dir)
+    episodes = layout.by_name()
 
+    def _jobs():
+        for parquet_file in parquet_files:
+            traj = store.episode(parquet_file.stem) if store is not None else load_episode(parquet_file)
+            videos = source_videos(layout, episodes[parquet_file.stem])
+            print(f"old:{parquet_file}")
+            yield traj, task_index_to_name[traj.task_index], videos
+
+    write_remuxed_dataset(local_dir, _jobs(), features, FPS, ROBOT_TYPE, video_mode=video_mode)
+    write_old_to_new([{"new_index": i, "old_index": p.stem} for i, p in enumerate(parquet_files)], local_dir)
+
+
+def create_lerobot_dataset_sharded(raw_dir: Path, repo_id, local_dir: Path, workers, prefetch=0, cameras=None, renderer_kwargs=None, writer_kwargs=None, store=None):
+    """Converts contiguous blocks of episodes in separate processes, then merges them into local_dir.
+
+    Source chunks are processed one after another, each split into up to
+    `workers` blocks. Each worker writes its own temporary LeRobot dataset;
+    lerobot_merge renumbers and concatenates them, so the result matches
+    the serial path.
+    """
+    parquet_files, _ = list_episodes(raw_dir, include_outputs=cameras is None, store=store)
+    shard_dir = local_dir.with_name(f".{local_dir.name}.shards")
+    if shard_dir.exists():
+        shutil.rmtree(shard_dir)
+    shard_dir.mkdir(parents=True)
+
+    # 按源数据集的 chunk 分组，保持转换顺序
+    episodes = DatasetLayout(raw_dir).by_name()
+    chunks = {}
+    for parquet_file in parquet_files:
+        chunks.setdefault(episodes[parquet_file.stem].chunk, []).append(parquet_file)
+
+    shard_roots = []
+    start = 0
+    store_path = store.path if store is not None else None
+    # lerobot/torch 持有线程和句柄，用 spawn 启动干净的子进程
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        for chunk, files in chunks.items():
+            # chunk 内连续分块，保证合并后 episode 和 task 的编号顺序与串行一致
+            bounds = np.linspace(0, len(files), workers + 1).astype(int)
+            shards = [
+                (shard_dir / f"chunk-{chunk:03d}-shard-{k:03d}", files[lo:hi], start + lo)
+                for k, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:])) if hi > lo
+            ]
+            print(f"chunk-{chunk:03d}: {len(files)} 个 episode，{len(shards)} 个进程")
+            futures = [pool.submit(_convert_shard, raw_dir, root, repo_id, block, lo, prefetch, cameras, renderer_kwargs, writer_kwargs, store_path) for root, block, lo in shards]
+            shard_roots += [future.result() for future in futures]
+            start += len(files)
+
+    merge_datasets(shard_roots, local_dir)
+    shutil.rmtree(shard_dir)
+    write_old_to_new([{"new_index": i, "old_index": p.stem} for i, p in enumerate(parquet_files)], local_dir)
 
 
 def main():
@@ -185,8 +488,71 @@ def main():
         type=str,
         help="Repositery identifier on Hugging Face: a community or a user name `/` the name of the dataset, required when push-to-hub is True",
     )
+    parser.add_argument("--workers", type=int, default=1, help="每个 chunk 内并行转换的进程数，>1 时各进程写临时数据集，最后合并")
+    parser.add_argument(
+        "--video-mode",
+        choices=["encode", "copy", "remux"],
+        default="encode",
+        help="encode: 解码后由 LeRobot 重新编码; copy/remux: 直接复制（或无损重封装）已有的 mp4，只生成表格数据和 meta，不转码",
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=0,
+        help="后台最多预先解码的 episode 数（不含正在保存的那个），与 save_episode 的编码重叠；内存中最多有 N+1 个 episode 的三路解码视频，0 为逐帧流式",
+    )
+    parser.add_argument("--draw-traj", action="store_true", help="转换时直接在内存里画轨迹，不读取 videos_traj/（一次解码、一次编码）")
+    parser.add_argument("--task-suite-name", type=str, default=None, help="--draw-traj 用的任务集名称，默认从 --raw-dir 目录名推断")
+    parser.add_argument("--camera-cache", type=Path, default=DEFAULT_CACHE_PATH, help="相机内外参缓存文件")
+    parser.add_argument("--window", type=int, default=32, help="轨迹窗口长度（步数）")
+    parser.add_argument("--overlay", choices=["exact", "batched"], default="exact", help="exact: 与 draw_line_for_libero.py 逐像素一致; batched: 颜色分桶批量绘制（颜色有损）；只有 --window 约 128 以上时才比 exact 快，默认窗口下更慢，--antialias 还会再慢一倍左右")
+    parser.add_argument("--antialias", action="store_true", help="batched 模式下使用抗锯齿线条")
+    parser.add_argument("--profile", type=Path, default=None, help="把每个 episode 各阶段的耗时/CPU/峰值内存写到这个 JSONL 文件（stage_profile.py 可汇总）")
+    parser.add_argument("--profile-top", type=int, default=0, help=">0 时同时开启 tracemalloc，记录每个阶段增长最多的分配位置")
+    parser.add_argument(
+        "--image-writer-processes",
+        type=int,
+        default=0,
+        help="LeRobot 异步写图片的进程数，0 表示只在主进程里用线程写",
+    )
+    parser.add_argument(
+        "--image-writer-threads",
+        type=int,
+        default=None,
+        help="每个写图片进程的线程数，默认每个相机 4 个（不超过本进程分到的 CPU 核数）；0 为同步写",
+    )
+    parser.add_argument(
+        "--batch-encoding-size",
+        type=int,
+        default=1,
+        help="攒够这么多 episode 再统一编码视频；1 为每个 episode 保存时立即编码，0 为全部转换完后再编码",
+    )
+    parser.add_argument(
+        "--frame-cache",
+        type=Path,
+        default=None,
+        help="解码帧缓存目录（最好在本地 NVMe 上）；绘制阶段写入的 observation.images.image 帧在这里直接 memory-map，不再解码",
+    )
+    parser.add_argument("--frame-cache-gb", type=float, default=DEFAULT_MAX_GB, help="帧缓存的大小上限，超出时淘汰最久未用的 episode")
+    parser.add_argument("--overwrite", action="store_true", help="删除已有输出重新转换；默认从已完成的 episode 之后继续")
     args = parser.parse_args()
-    create_lerobot_dataset(**vars(args))
+    profile, profile_top = args.profile, args.profile_top
+    del args.profile, args.profile_top
+    if profile is not None:
+        enable_profile(profile, profile_top)
+    if args.frame_cache is not None:
+        enable_frame_cache(args.frame_cache, args.frame_cache_gb)
+    del args.frame_cache, args.frame_cache_gb
+    cameras = traj_cameras(args.raw_dir, args.task_suite_name, args.camera_cache) if args.draw_traj else None
+    renderer_kwargs = {"window": args.window, "overlay": args.overlay, "antialias": args.antialias}
+    writer_kwargs = {
+        "image_writer_processes": args.image_writer_processes,
+        "image_writer_threads": args.image_writer_threads,
+        "batch_encoding_size": args.batch_encoding_size,
+    }
+    for name in ("draw_traj", "task_suite_name", "camera_cache", "window", "overlay", "antialias", *writer_kwargs):
+        delattr(args, name)
+    create_lerobot_dataset(**vars(args), cameras=cameras, renderer_kwargs=renderer_kwargs, writer_kwargs=writer_kwargs)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from video_io import probe_frame_count
+
+
+# 参与渲染的源码，任何一个改动都会让旧输出失效
+_CODE_FILES = ["traj_render.py", "episode_render.py", "episode_loader.py", "video_io.py"]
+
+
+def code_version():
+    h = hashlib.sha1()
+    for name in _CODE_FILES:
+        h.update((Path(__file__).parent / name).read_bytes())
+    return h.hexdigest()[:12]
+
+
+def file_stat(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _jsonable(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, dict):
+        return {str(k): _jsonable(v) for k, v in sorted(obj.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(obj, (list, tuple)):
+        return [_jsonable(v) for v in obj]
+    if isinstance(obj, Path):
+        return str(obj)
+    return obj
+
+
+def params_digest(**params):
+    """Stable hash of render parameters (camera matrices, renderer/encoder options, code version)."""
+    params = dict(params, code_version=code_version())
+    return hashlib.sha1(json.dumps(_jsonable(params), sort_keys=True).encode()).hexdigest()[:16]
+
+
+def job_fingerprint(video_file, parquet_path, params):
+    return {
+        "video": file_stat(video_file),
+        "parquet": file_stat(parquet_path),
+        "params": params,
+    }
+
+
+def _output_frames(path):
+    if Path(path).suffix == ".npz":
+        try:
+            with np.load(path) as data:
+                return len(data["pixels"])
+        except Exception:
+            return None
+    return probe_frame_count(path)
+
+
+class RenderManifest:
+    """Append-only JSONL record of finished episodes, keyed by output path.
+
+    Only the process that owns the manifest writes to it; the last record of
+    a key wins, so re-rendering an episode just appends a new line.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.records = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 崩溃时可能留下半行
+                        continue
+                    self.records[record["output"]] = record
+
+    def is_done(self, save_path, fingerprint):
+        """True if save_path was rendered from the same inputs/params and still looks intact."""
+        record = self.records.get(str(save_path))
+        if record is None or record["fingerprint"] != fingerprint:
+            return False
+        save_path = Path(save_path)
+        if not save_path.exists() or file_stat(save_path) != record["output_stat"]:
+            return False
+        return _output_frames(save_path) == record["n_frames"]
+
+    def record(self, save_path, fingerprint, n_frames):
+        record = {
+            "output": str(save_path),
+            "fingerprint": fingerprint,
+            "output_stat": file_stat(save_path),
+            "n_frames": n_frames,
+        }
+        self.records[record["output"]] = record
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import imageio
+import pyarrow.parquet as pq
+import tqdm
+
+from dataset_layout import DatasetLayout
+from video_io import probe_frame_count
+
+
+QUARANTINE_NAME = "quarantine.json"
+
+
+def quarantine_path(dataset_root):
+    return Path(dataset_root) / "meta" / QUARANTINE_NAME
+
+
+def load_quarantine(dataset_root, include_outputs=False):
+    """Episode names (parquet stems) to skip; include_outputs also skips episodes with a bad videos_traj file."""
+    path = quarantine_path(dataset_root)
+    if not path.exists():
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    names = set(data["quarantine"])
+    if include_outputs:
+        names |= set(data["bad_outputs"])
+    return names
+
+
+def _tail_ok(video_path, n_expected):
+    """Decodes only the last GOP and checks that the last frame has the expected index."""
+    try:
+        import av
+    except ImportError:
+        av = None
+
+    if av is None:
+        reader = imageio.get_reader(video_path)
+        try:
+            reader.get_data(n_expected - 1)
+            return True
+        except Exception:
+            return False
+        finally:
+            reader.close()
+
+    try:
+        with av.open(str(video_path)) as container:
+            stream = container.streams.video[0]
+            rate = float(stream.average_rate)
+            start = stream.start_time or 0
+            target = start + int((n_expected - 1) / rate / stream.time_base)
+            container.seek(target, stream=stream, backward=True)
+            last = None
+            for frame in container.decode(stream):
+                last = frame
+            if last is None or last.pts is None:
+                return False
+            return round(float((last.pts - start) * stream.time_base) * rate) == n_expected - 1
+    except Exception:
+        return False
+
+
+def count_decodable_frames(video_path):
+    """Fully decodes a video and returns how many frames decode before the first error."""
+    n = 0
+    try:
+        reader = imageio.get_reader(video_path)
+    except Exception:
+        return 0
+    try:
+        for _ in reader:
+            n += 1
+    except Exception:
+        pass
+    finally:
+        reader.close()
+    return n
+
+
+def check_video(video_path, n_expected, full=False):
+    """Cheap container checks first; full decode only for suspicious files (or always with full=True)."""
+    result = {"path": str(video_path), "expected": n_expected}
+    result["header"] = probe_frame_count(video_path)
+    result["tail_ok"] = result["header"] is not None and _tail_ok(video_path, n_expected)
+    suspicious = result["header"] != n_expected or not result["tail_ok"]
+    if suspicious or full:
+        result["decoded"] = count_decodable_frames(video_path)
+        result["ok"] = result["decoded"] == n_expected
+    else:
+        result["ok"] = True
+    return result
+
+
+def collect_videos(dataset_root):
+    """Yields (episode name, group, video_path, expected frame count) for videos/ and videos_traj/ of all chunks."""
+    layout = DatasetLayout(dataset_root)
+    episodes = {ref.episode_index: (ref.name, pq.read_metadata(ref.parquet_path).num_rows) for ref in layout.episodes()}
+    for group in ("videos", "videos_traj"):
+        for _, episode_index, video_path in layout.videos(group):
+            if episode_index not in episodes:
+                print(f"{video_path} 没有对应的 parquet")
+                continue
+            name, length = episodes[episode_index]
+            yield name, group, video_path, length
+
+
+def scan_dataset(dataset_root, workers=os.cpu_count(), full=False):
+    """Checks every video of a dataset in parallel and writes meta/quarantine.json."""
+    videos = list(collect_videos(dataset_root))
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(check_video, path, n, full): (name, group) for name, group, path, n in videos}
+        for future in tqdm.tqdm(as_completed(futures), total=len(futures)):
+            name, group = futures[future]
+            result = future.result()
+            result.update(episode=name, group=group)
+            results.append(result)
+
+    bad = [r for r in results if not r["ok"]]
+    data = {
+        # 源视频坏了：绘制和转换都跳过
+        "quarantine": sorted({r["episode"] for r in bad if r["group"] == "videos"}),
+        # 轨迹视频坏了：需要重新绘制，转换时跳过
+        "bad_outputs": sorted({r["episode"] for r in bad if r["group"] == "videos_traj"}),
+        "details": sorted(bad, key=lambda r: r["path"]),
+        "n_checked": len(results),
+    }
+    path = quarantine_path(dataset_root)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--root",
+        type=Path,
+        required=True,
+        help="LeRobot dataset root (e.g. `.../libero_10_no_noops_1.0.0_lerobot`).",
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="并行检查的进程数")
+    parser.add_argument("--full", action="store_true", help="完整解码所有视频，而不只是可疑的视频")
+    args = parser.parse_args()
+
+    data = scan_dataset(args.root, workers=args.workers, full=args.full)
+    print(f"检查 {data['n_checked']} 个视频，隔离 {len(data['quarantine'])} 个 episode，{len(data['bad_outputs'])} 个轨迹视频需要重画")
+    for r in data["details"]:
+        print(r["path"], f"expected={r['expected']} header={r['header']} decoded={r.get('decoded')}")
+    print(quarantine_path(args.root))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import argparse
+import contextlib
+import json
+import os
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+
+# 通过环境变量开启，spawn/fork 出来的子进程也会自动记录
+PROFILE_ENV = "LIBERO_PROFILE"
+TOP_ENV = "LIBERO_PROFILE_TOP"
+
+
+def _proc_status():
+    """VmRSS/VmHWM in MiB from /proc/self/status, or {} where it does not exist."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            fields = dict(line.split(":", 1) for line in f if line.startswith(("VmRSS", "VmHWM")))
+    except OSError:
+        return {}
+    return {k: int(v.split()[0]) / 1024 for k, v in fields.items()}
+
+
+def _reset_peak_rss():
+    """Resets VmHWM to the current RSS (Linux >= 4.0); returns False if not supported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class StageProfiler:
+    """Appends one JSONL record per stage: wall/CPU time, RSS and peak RSS, optional tracemalloc top allocations.
+
+    Peak RSS is process-wide over the stage (other threads included); CPU
+    time is process CPU time, so it exceeds wall time when threads run in
+    parallel. Nested stages are supported; each record carries its depth.
+    With top > 0, tracemalloc runs for the whole process and every stage
+    records its Python peak and the `top` lines that grew the most.
+    """
+
+    def __init__(self, path, top=0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.top = top
+        self._lock = threading.Lock()
+        self._stack = []
+        if top > 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def stage(self, name, **labels):
+        status = _proc_status()
+        if self._stack:
+            # 重置 VmHWM / tracemalloc 峰值之前先把父阶段目前的峰值记下来
+            parent = self._stack[-1]
+            parent["peak"] = max(parent["peak"], status.get("VmHWM", 0))
+            if self.top > 0:
+                parent["py_peak"] = max(parent["py_peak"], tracemalloc.get_traced_memory()[1])
+        frame = {"peak": 0.0, "py_peak": 0}
+        frame["hwm_reset"] = _reset_peak_rss()
+        self._stack.append(frame)
+        snapshot = None
+        if self.top > 0:
+            tracemalloc.reset_peak()
+            snapshot = tracemalloc.take_snapshot()
+        wall, cpu = time.perf_counter(), time.process_time()
+        record = {"stage": name, **labels, "pid": os.getpid(), "depth": len(self._stack) - 1, "start": time.time()}
+        try:
+            yield record
+        finally:
+            record["wall_s"] = round(time.perf_counter() - wall, 6)
+            record["cpu_s"] = round(time.process_time() - cpu, 6)
+            end = _proc_status()
+            self._stack.pop()
+            peak = max(frame["peak"], end.get("VmHWM", 0))
+            record["rss_start_mb"] = round(status.get("VmRSS", 0), 1)
+            record["rss_end_mb"] = round(end.get("VmRSS", 0), 1)
+            # 不支持重置时 VmHWM 是进程启动以来的峰值
+            record["rss_peak_mb"] = round(peak, 1) if frame["hwm_reset"] else None
+            py_peak = max(frame["py_peak"], tracemalloc.get_traced_memory()[1]) if snapshot is not None else 0
+            if self._stack:
+                self._stack[-1]["peak"] = max(self._stack[-1]["peak"], peak)
+                self._stack[-1]["py_peak"] = max(self._stack[-1]["py_peak"], py_peak)
+            if snapshot is not None:
+                record["py_peak_mb"] = round(py_peak / 2**20, 2)
+                diff = tracemalloc.take_snapshot().compare_to(snapshot, "lineno")[: self.top]
+                record["top"] = [
+                    {"where": f"{s.traceback[0].filename}:{s.traceback[0].lineno}", "size_mb": round(s.size / 2**20, 3), "diff_mb": round(s.size_diff / 2**20, 3)}
+                    for s in diff
+                ]
+            self._write(record)
+
+    def _write(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+_profiler = None
+_resolved = False
+
+
+def enable(path, top=0):
+    """Turns profiling on for this process and for child processes started afterwards."""
+    global _profiler, _resolved
+    os.environ[PROFILE_ENV] = str(path)
+    os.environ[TOP_ENV] = str(top)
+    _profiler = StageProfiler(path, top)
+    _resolved = True
+    return _profiler
+
+
+def get_profiler():
+    global _profiler, _resolved
+    if not _resolved:
+        _resolved = True
+        if os.environ.get(PROFILE_ENV):
+            _profiler = StageProfiler(os.environ[PROFILE_ENV], int(os.environ.get(TOP_ENV, "0")))
+    return _profiler
+
+
+def stage(name, **labels):
+    """Context manager timing one stage; a no-op unless profiling is enabled."""
+    profiler = get_profiler()
+    if profiler is None:
+        return contextlib.nullcontext({})
+    return profiler.stage(name, **labels)
+
+
+def profile_iter(iterable, name, **labels):
+    """Records every next() of iterable as a stage (e.g. waiting for the next episode)."""
+    it = iter(iterable)
+    i = 0
+    while True:
+        with stage(name, item=i, **labels):
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+        yield item
+        i += 1
+
+
+def summarize(path):
+    """Per-stage count, total/mean wall and CPU time and max peak RSS of a profile file."""
+    groups = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                groups.setdefault(record["stage"], []).append(record)
+    rows = []
+    for name, records in groups.items():
+        wall = sum(r["wall_s"] for r in records)
+        peaks = [r["rss_peak_mb"] for r in records if r.get("rss_peak_mb") is not None]
+        rows.append({
+            "stage": name,
+            "count": len(records),
+            "wall_s": round(wall, 3),
+            "mean_wall_s": round(wall / len(records), 4),
+            "cpu_s": round(sum(r["cpu_s"] for r in records), 3),
+            "max_rss_peak_mb": max(peaks) if peaks else None,
+            "max_py_peak_mb": max((r["py_peak_mb"] for r in records if "py_peak_mb" in r), default=None),
+        })
+    return sorted(rows, key=lambda r: -r["wall_s"])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("profile", type=Path, help="--profile 写出的 JSONL 文件")
+    args = parser.parse_args()
+    for row in summarize(args.profile):
+        print(f"{row['stage']:20s} n={row['count']:<6} wall={row['wall_s']:>10.2f}s mean={row['mean_wall_s']:>8.3f}s "
+              f"cpu={row['cpu_s']:>10.2f}s peak_rss={row['max_rss_peak_mb']}MB py_peak={row['max_py_peak_mb']}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+import bisect
+import queue
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import imageio
+import numpy as np
+
+from frame_cache import get_cache
+
+
+_DONE = object()
+
+
+def iter_frames(video_path, indices=None, cached=False):
+    """Yields decoded frames of a video one at a time; only `indices` (in order) if given.
+
+    With cached=True and the frame cache enabled (frame_cache.enable), frames
+    are read from the cache's memory-mapped copy; on a miss the decoded
+    frames are streamed as usual and written into the cache as they pass.
+    Partial reads (`indices`) only use existing entries.
+    """
+    cache = get_cache() if cached else None
+    if cache is not None:
+        frames = cache.get(video_path)
+        if frames is not None:
+            for i in range(len(frames)) if indices is None else indices:
+                yield frames[i]
+            return
+        n_frames = probe_frame_count(video_path) if indices is None else None
+        if n_frames:
+            yield from cache.write_through(video_path, iter_frames(video_path), n_frames)
+            return
+    if indices is not None:
+        with FrameReader(video_path) as reader:
+            for i in indices:
+                yield reader.get_frame(i)
+        return
+    reader = imageio.get_reader(video_path)
+    try:
+        for frame in reader:
+            yield np.asarray(frame)
+    finally:
+        reader.close()
+
+
+class FrameReader:
+    """Random access to video frames by index.
+
+    With PyAV, packets are indexed once without decoding; a request seeks to
+    the keyframe of its GOP and decodes only up to the frame it needs.
+    Decoded GOP prefixes are kept in a small LRU cache, so sparse or
+    windowed access costs proportionally to the frames requested rather
+    than the episode length. Without PyAV it falls back to imageio's
+    get_data.
+    """
+
+    def __init__(self, video_path, cache_gops=4):
+        self.video_path = Path(video_path)
+        self.cache_gops = cache_gops
+        self._cache = OrderedDict()
+        try:
+            import av
+        except ImportError:
+            av = None
+
+        if av is None:
+            self._container = None
+            self._reader = imageio.get_reader(self.video_path)
+            self._len = self._reader.count_frames()
+            return
+
+        self._reader = None
+        self._container = av.open(str(self.video_path))
+        self._stream = self._container.streams.video[0]
+        packets = [
+            (p.pts, p.is_keyframe)
+            for p in self._container.demux(self._stream)
+            if p.pts is not None
+        ]
+        packets.sort()
+        self._pts = [pts for pts, _ in packets]
+        self._index_of = {pts: i for i, pts in enumerate(self._pts)}
+        # 每个 GOP 的起始帧号
+        self._gop_starts = [i for i, (_, key) in enumerate(packets) if key] or [0]
+        self._len = len(self._pts)
+
+    def __len__(self):
+        return self._len
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._container is not None:
+            self._container.close()
+            self._container = None
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        self._cache.clear()
+
+    def _decode_gop(self, gop, upto):
+        """Decodes GOP `gop` from its keyframe through frame `upto` (inclusive)."""
+        start = self._gop_starts[gop]
+        self._container.seek(self._pts[start], stream=self._stream, backward=True)
+        frames = []
+        for frame in self._container.decode(self._stream):
+            i = self._index_of.get(frame.pts)
+            if i is None or i < start:
+                continue
+            frames.append(frame.to_ndarray(format="rgb24"))
+            if i >= upto:
+                break
+        return frames
+
+    def get_frame(self, index):
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError(f"frame {index} out of range for {self.video_path} ({self._len} frames)")
+        if self._container is None:
+            return np.asarray(self._reader.get_data(index))
+
+        return self._get(index, index)
+
+    def _get(self, index, upto):
+        """Frame `index`, decoding its GOP through `upto` if it is not cached yet."""
+        gop = bisect.bisect_right(self._gop_starts, index) - 1
+        offset = index - self._gop_starts[gop]
+        frames = self._cache.get(gop)
+        if frames is None or len(frames) <= offset:
+            frames = self._decode_gop(gop, max(index, upto))
+            if len(frames) <= offset:
+                raise IndexError(f"frame {index} of {self.video_path} could not be decoded")
+            self._cache[gop] = frames
+            if len(self._cache) > self.cache_gops:
+                self._cache.popitem(last=False)
+        self._cache.move_to_end(gop)
+        return frames[offset]
+
+    def get_frames(self, indices):
+        """Returns the requested frames as a (N, H, W, 3) uint8 array, in the order given."""
+        indices = [i + self._len if i < 0 else i for i in indices]
+        wanted = sorted(set(indices))
+        if wanted and not 0 <= wanted[0] <= wanted[-1] < self._len:
+            raise IndexError(f"frames {indices} out of range for {self.video_path} ({self._len} frames)")
+        if self._container is None:
+            decoded = {i: np.asarray(self._reader.get_data(i)) for i in wanted}
+        else:
+            # 同一个 GOP 只解码一次：直接解码到该 GOP 内最大的请求帧
+            gops = [bisect.bisect_right(self._gop_starts, i) - 1 for i in wanted]
+            last_in_gop = dict(zip(gops, wanted))
+            decoded = {i: self._get(i, last_in_gop[gop]) for i, gop in zip(wanted, gops)}
+        if not indices:
+            return np.zeros((0, 0, 0, 3), dtype=np.uint8)
+        return np.stack([decoded[i] for i in indices])
+
+
+def video_fps(video_path):
+    """Frame rate from the container metadata."""
+    reader = imageio.get_reader(video_path)
+    try:
+        return reader.get_meta_data()["fps"]
+    finally:
+        reader.close()
+
+
+def probe_frame_count(video_path):
+    """Frame count from the container header without decoding; None if it cannot be read."""
+    try:
+        import av
+    except ImportError:
+        av = None
+    try:
+        if av is not None:
+            with av.open(str(video_path)) as container:
+                n = container.streams.video[0].frames
+            if n:
+                return n
+        reader = imageio.get_reader(video_path)
+        try:
+            n = reader.get_meta_data().get("nframes")
+        finally:
+            reader.close()
+    except Exception:
+        return None
+    return int(n) if n and n != float("inf") else None
+
+
+def _ffmpeg_exe():
+    try:
+        import imageio_ffmpeg
+
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except ImportError:
+        return "ffmpeg"
+
+
+def remux_video(src_path, dst_path):
+    """Rewrites the container of a video without re-encoding (stream copy, moov atom up front)."""
+    cmd = [
+        _ffmpeg_exe(), "-y", "-loglevel", "error",
+        "-i", str(src_path),
+        "-map", "0:v:0", "-c", "copy", "-movflags", "+faststart",
+        str(dst_path),
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg remux of {src_path} failed: {result.stderr.decode(errors='replace')[-2000:]}")
+    return dst_path
+
+
+def video_info(video_path):
+    """Stream properties in the form LeRobot stores under features[key]["info"]."""
+    import av
+
+    with av.open(str(video_path)) as container:
+        stream = container.streams.video[0]
+        pix_fmt = stream.pix_fmt or stream.codec_context.pix_fmt
+        return {
+            "video.height": stream.height,
+            "video.width": stream.width,
+            "video.codec": stream.codec_context.codec.canonical_name,
+            "video.pix_fmt": pix_fmt,
+            "video.is_depth_map": False,
+            "video.fps": int(stream.base_rate),
+            "video.channels": 4 if "rgba" in pix_fmt or "yuva" in pix_fmt else 1 if "gray" in pix_fmt else 3,
+            "has_audio": len(container.streams.audio) > 0,
+        }
+
+
+class FFmpegWriter:
+    """Streams raw RGB frames over stdin to an ffmpeg subprocess.
+
+    Same append_data/close interface as imageio writers. The process is
+    started on the first frame, once the frame size is known.
+    """
+
+    def __init__(self, path, fps, codec="libx264", preset="medium", crf=23, threads=0, pix_fmt="yuv420p", gop=None):
+        self.path = Path(path)
+        self.fps = fps
+        self.codec = codec
+        self.preset = preset
+        self.crf = crf
+        self.threads = threads
+        self.pix_fmt = pix_fmt
+        self.gop = gop
+        self._proc = None
+        # stderr 写到临时文件，避免管道写满导致 ffmpeg 阻塞
+        self._log = tempfile.TemporaryFile()
+
+    def _start(self, height, width):
+        cmd = [
+            _ffmpeg_exe(), "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(self.fps), "-i", "-",
+            "-an", "-c:v", self.codec, "-preset", self.preset, "-crf", str(self.crf),
+            "-threads", str(self.threads), "-pix_fmt", self.pix_fmt,
+        ]
+        if self.gop is not None:
+            cmd += ["-g", str(self.gop)]
+        cmd.append(str(self.path))
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=self._log)
+
+    def append_data(self, frame):
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        if self._proc is None:
+            self._start(*frame.shape[:2])
+        try:
+            self._proc.stdin.write(frame.data)
+        except BrokenPipeError:
+            self.close()
+
+    def close(self):
+        if self._proc is None:
+            self._log.close()
+            return
+        proc, self._proc = self._proc, None
+        proc.stdin.close()
+        returncode = proc.wait()
+        self._log.seek(0)
+        log = self._log.read().decode(errors="replace")
+        self._log.close()
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg exited with {returncode} writing {self.path}:\n{log[-2000:]}")
+
+
+def open_writer(path, fps, backend="imageio", codec="libx264", **options):
+    """Opens a video writer; backend "ffmpeg" takes preset/crf/threads/pix_fmt/gop options."""
+    if backend == "imageio":
+        return imageio.get_writer(path, fps=fps, codec=codec)
+    if backend == "ffmpeg":
+        return FFmpegWriter(path, fps, codec=codec, **options)
+    raise ValueError(f"unknown encoder backend: {backend}")
+
+
+def threaded(iterable, maxsize=8):
+    """Runs `iterable` in a background thread and yields its items through a bounded queue.
+
+    Exceptions raised by the producer are re-raised in the consumer. Closing the
+    returned generator early stops the producer.
+    """
+    q = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    error = []
+
+    def _put(item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce():
+        it = iter(iterable)
+        try:
+            for item in it:
+                if not _put(item):
+                    return
+        except BaseException as e:
+            error.append(e)
+        finally:
+            if hasattr(it, "close"):
+                it.close()
+            _put(_DONE)
+
+    thread = threading.Thread(target=_produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = q.get()
+            if item is _DONE:
+                break
+            yield item
+        if error:
+            raise error[0]
+    finally:
+        stop.set()
+        thread.join()
+
+
+def iter_lockstep(video_paths, expected_len=None, queue_size=8, cached=None):
+    """Yields tuples with the i-th frame of every video, decoding each video in its own thread.
+
+    Raises ValueError as soon as one video ends before the others, or any
+    runs past expected_len / ends short of it, so at most one frame per
+    stream (plus the queues) is held in memory. cached has one flag per
+    video for iter_frames.
+    """
+    cached = cached or [False] * len(video_paths)
+    streams = [threaded(iter_frames(p, cached=c), queue_size) for p, c in zip(video_paths, cached)]
+    try:
+        i = 0
+        while True:
+            frames = [next(s, _DONE) for s in streams]
+            ended = [f is _DONE for f in frames]
+            if all(ended):
+                break
+            if any(ended) or (expected_len is not None and i >= expected_len):
+                raise ValueError("lenth of state must equal to lenth of frame")
+            yield tuple(frames)
+            i += 1
+        if expected_len is not None and i != expected_len:
+            raise ValueError("lenth of state must equal to lenth of frame")
+    finally:
+        for s in streams:
+            s.close()
+
+
+def stream_video(src_path, dst_path, draw_fn, expected_len=None, fps=None, queue_size=8, encoder_kwargs=None, indices=None, cached=False):
+    """Decodes, draws and encodes a video in three overlapping stages.
+
+    draw_fn(frame, index) returns the frame to write. Decoder, drawer and
+    encoder are joined by bounded queues, so memory stays constant no
+    matter how long the episode is. If `expected_len` is given and the
+    number of decoded frames differs, the partial output is removed and a
+    ValueError is raised. fps defaults to the source video's frame rate;
+    encoder_kwargs are passed to open_writer. With `indices`, only those
+    source frames are decoded (via FrameReader) and written, and draw_fn
+    receives their original index; the length check is skipped. cached is
+    passed to iter_frames.
+
+    Returns the number of frames written.
+    """
+    dst_path = Path(dst_path)
+
+    if indices is not None:
+        indices = list(indices)
+        expected_len = None
+
+    def _draw(frames):
+        for i, frame in zip(indices or range(2**62), frames):
+            if expected_len is not None and i >= expected_len:
+                raise ValueError(f"lenth of state ({expected_len}) must equal to lenth of frame (> {expected_len})")
+            yield draw_fn(frame, i)
+
+    decoded = threaded(iter_frames(src_path, indices, cached=cached), queue_size)
+    drawn = threaded(_draw(decoded), queue_size)
+
+    count = 0
+    if fps is None:
+        fps = video_fps(src_path)
+    writer = open_writer(dst_path, fps, **(encoder_kwargs or {}))
+    try:
+        for frame in drawn:
+            writer.append_data(frame)
+            count += 1
+    except BaseException:
+        try:
+            writer.close()
+        except Exception:
+            pass
+        dst_path.unlink(missing_ok=True)
+        raise
+    finally:
+        # 先停下游再停上游，避免在另一个线程正在执行时关闭生成器
+        drawn.close()
+        decoded.close()
+    writer.close()
+
+    if expected_len is not None and count != expected_len:
+        dst_path.unlink(missing_ok=True)
+        raise ValueError(f"lenth of state ({expected_len}) must equal to lenth of frame ({count})")
+    return count